@@ -0,0 +1,318 @@
+"""
+Cache backend keeping its entries in a dedicated SQLite database, so every worker process on the box shares one
+cache: a page rendered by one worker is a hit in the others, and an invalidation made in one is seen by all.
+
+LOCATION is the database file. OPTIONS takes, on top of MAX_ENTRIES and CULL_FREQUENCY:
+    'MAX_SIZE': bytes of stored values. Past it or past MAX_ENTRIES, expired entries are dropped, then the least
+        recently read ones until the cache is 1/CULL_FREQUENCY below the cap.
+    'L1_TIMEOUT': seconds a value this process read or wrote is served from its own memory without asking the
+        database, so another worker's set() or delete() of it may go unseen for that long; 0 turns the tier off.
+        Integers always come from the database, so counters bumped with incr() change everywhere at once.
+    'L1_MAX_ENTRIES': values each process keeps in that tier.
+    'ACCESS_RESOLUTION': reads record their time for LRU eviction at most once per entry in this many seconds,
+        so hot entries don't turn every read into a write.
+    'BUSY_TIMEOUT': seconds to wait for another worker's write to finish.
+    'MMAP_SIZE': bytes of the database file read through a memory map rather than read() calls.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entry_accessed ON cache_entry (accessed);
+CREATE TABLE IF NOT EXISTS cache_usage (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_usage VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entry_inserted AFTER INSERT ON cache_entry BEGIN
+    UPDATE cache_usage SET entries = entries + 1, size = size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_resized AFTER UPDATE OF size ON cache_entry BEGIN
+    UPDATE cache_usage SET size = size - OLD.size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entry_deleted AFTER DELETE ON cache_entry BEGIN
+    UPDATE cache_usage SET entries = entries - 1, size = size - OLD.size;
+END;
+'''
+
+SET_SQL = (
+    'INSERT INTO cache_entry (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?) '
+    'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+    'accessed = excluded.accessed, size = excluded.size'
+)
+# NULL never compares, so an entry without expiry is never replaced.
+ADD_SQL = SET_SQL + ' WHERE cache_entry.expires <= excluded.accessed'
+LIVE = '(expires IS NULL OR expires > ?)'
+MAX_VARIABLES = 500
+INTEGER_RANGE = range(-2 ** 63, 2 ** 63)
+
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """The values of one cache last read or written by this process, each kept for at most timeout seconds."""
+
+    def __init__(self, timeout, max_entries):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            value, until = item
+            if until <= now:
+                del self._values[key]
+                return None
+            self._values.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires, now):
+        if not self.timeout:
+            return
+        until = now + self.timeout
+        if expires is not None:
+            until = min(until, expires)
+        with self._lock:
+            self._values[key] = value, until
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._location = str(location)
+        self._max_size = options.get('MAX_SIZE')
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 10)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._mmap_size = options.get('MMAP_SIZE', 256 * 1024 * 1024)
+        # Django makes a backend per thread; the L1 tier is shared by all of this process's threads.
+        with _local_tiers_lock:
+            self._l1 = _local_tiers.setdefault(self._location, LocalTier(
+                options.get('L1_TIMEOUT', 1), options.get('L1_MAX_ENTRIES', 1000),
+            ))
+        self._local = threading.local()
+
+    def _connection(self):
+        # A connection must not cross a fork, so workers forked from a preloaded app open their own.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            connection = sqlite3.connect(self._location, timeout=self._busy_timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = wal')
+            connection.execute('PRAGMA synchronous = normal')
+            connection.execute(f'PRAGMA mmap_size = {int(self._mmap_size)}')
+            connection.executescript(SCHEMA)
+            self._local.connection, self._local.pid = connection, pid
+        return self._local.connection
+
+    def _write(self, statements):
+        """Run (sql, params) statements in one transaction, evicting entries when it leaves the cache over a cap.
+
+        Returns the number of rows each statement changed.
+        """
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            changed = [connection.execute(sql, params).rowcount for sql, params in statements]
+            self._cull(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return changed
+
+    def _usage(self, connection):
+        return connection.execute('SELECT entries, size FROM cache_usage').fetchone()
+
+    def _cull(self, connection):
+        entries, size = self._usage(connection)
+        if entries <= self._max_entries and (self._max_size is None or size <= self._max_size):
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache_entry')
+            return
+        connection.execute('DELETE FROM cache_entry WHERE expires <= ?', (time.time(),))
+        keep = 1 - 1 / self._cull_frequency
+        entries, size = self._usage(connection)
+        if entries > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_entry ORDER BY accessed LIMIT ?)',
+                (entries - int(self._max_entries * keep),),
+            )
+            entries, size = self._usage(connection)
+        if self._max_size is not None and size > self._max_size:
+            # Keeps the most recently read entries that fit in the target size.
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key IN (SELECT key FROM ('
+                'SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) AS kept FROM cache_entry'
+                ') WHERE kept > ?)',
+                (int(self._max_size * keep),),
+            )
+
+    def _encode(self, value):
+        # Integers are stored as such, so incr() is a single UPDATE.
+        if type(value) is int and value in INTEGER_RANGE:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _decode(value):
+        return value if isinstance(value, int) else pickle.loads(value)
+
+    def _remember(self, key, value, expires, now):
+        if isinstance(value, int):
+            self._l1.discard([key])
+        else:
+            self._l1.set(key, value, expires, now)
+
+    def _set_params(self, key, value, timeout, now):
+        encoded = self._encode(value)
+        expires = self.get_backend_timeout(timeout)
+        size = 8 if isinstance(encoded, int) else len(encoded)
+        return (key, encoded, expires, now, size), encoded
+
+    def _fetch(self, keys):
+        now = time.time()
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._l1.get(key, now)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        connection = self._connection()
+        touched = []
+        for start in range(0, len(missing), MAX_VARIABLES):
+            chunk = missing[start:start + MAX_VARIABLES]
+            rows = connection.execute(
+                f'SELECT key, value, expires, accessed FROM cache_entry '
+                f'WHERE key IN ({", ".join("?" * len(chunk))}) AND {LIVE}',
+                (*chunk, now),
+            )
+            for key, value, expires, accessed in rows:
+                found[key] = value
+                self._remember(key, value, expires, now)
+                if accessed < now - self._access_resolution:
+                    touched.append(key)
+        if touched:
+            self._touch_accessed(connection, touched, now)
+        return {key: self._decode(value) for key, value in found.items()}
+
+    def _touch_accessed(self, connection, keys, now):
+        try:
+            for start in range(0, len(keys), MAX_VARIABLES):
+                chunk = keys[start:start + MAX_VARIABLES]
+                connection.execute(
+                    f'UPDATE cache_entry SET accessed = ? WHERE key IN ({", ".join("?" * len(chunk))})',
+                    (now, *chunk),
+                )
+        except sqlite3.OperationalError:
+            # LRU bookkeeping is not worth failing a read over.
+            pass
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        params, encoded = self._set_params(key, value, timeout, now)
+        added = self._write([(ADD_SQL, params)])[0] > 0
+        if added:
+            self._remember(key, encoded, params[2], now)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        return {keys[key]: value for key, value in self._fetch(list(keys)).items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        entries = [
+            self._set_params(self.make_and_validate_key(key, version=version), value, timeout, now)
+            for key, value in data.items()
+        ]
+        if entries:
+            self._write([(SET_SQL, params) for params, _ in entries])
+            for params, encoded in entries:
+                self._remember(params[0], encoded, params[2], now)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._l1.discard([key])
+        return self._write([(
+            f'UPDATE cache_entry SET expires = ? WHERE key = ? AND {LIVE}',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )])[0] > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        # Fetching every row steps the statement to its end, which releases the write lock.
+        rows = self._connection().execute(
+            f"UPDATE cache_entry SET value = value + ? WHERE key = ? AND typeof(value) = 'integer' AND {LIVE} "
+            f"RETURNING value",
+            (delta, key, time.time()),
+        ).fetchall()
+        if not rows:
+            raise ValueError("Key '%s' not found." % key)
+        return rows[0][0]
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        if self._l1.get(key, time.time()) is not None:
+            return True
+        row = self._connection().execute(f'SELECT 1 FROM cache_entry WHERE key = ? AND {LIVE}', (key, time.time()))
+        return row.fetchone() is not None
+
+    def delete(self, key, version=None):
+        return self.delete_many([key], version=version) > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        self._l1.discard(keys)
+        return sum(self._write([
+            (f'DELETE FROM cache_entry WHERE key IN ({", ".join("?" * len(chunk))})', chunk)
+            for chunk in (keys[start:start + MAX_VARIABLES] for start in range(0, len(keys), MAX_VARIABLES))
+        ]))
+
+    def clear(self):
+        self._l1.clear()
+        self._write([('DELETE FROM cache_entry', ())])
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,15 +51,38 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    # First, so lock errors raised by any other middleware are tagged too.
+    'shop.instrumentation.DatabaseErrorMiddleware',
+    'shop.instrumentation.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.pagecache.PageCacheMiddleware',
+    'shop.replication.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Most queries a request to each URL name may run; shop.instrumentation logs a warning above it and the
+# query_budget test fixture fails. Counts include the session and user lookups, and the conditional GET validators.
+QUERY_BUDGETS = {
+    'landing_page': 4,
+    'boardgames_list': 8,
+    'boardgame_details': 7,
+    'cart_list': 4,
+    'make_order': 7,
+    'orders_list': 3,
+    'order_detail': 4,
+    'reviews_list': 5,
+    'review_detail': 3,
+    'profile_view': 2,
+    'sales_report': 6,
+    'hole': 3,
+    'boardgames_api': 3,
+}
+
 ROOT_URLCONF = 'BoardgameShop.urls'
 
 TEMPLATES = [
@@ -83,11 +107,83 @@ WSGI_APPLICATION = 'BoardgameShop.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# WAL lets readers run while a writer commits; the rest trade a little durability on power loss (synchronous=NORMAL)
+# for far fewer fsyncs. Every value can be overridden per environment with a SQLITE_* variable.
+SQLITE_OPTIONS = {
+    'pragmas': {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'wal'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'normal'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        # Negative sizes are in KiB.
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
+        'temp_store': 'memory',
+    },
+    'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'ENGINE': 'BoardgameShop.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': SQLITE_OPTIONS,
+        'TEST': {
+            # A file rather than shared-cache memory, so concurrency tests see real SQLite locking.
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # A read-only copy of default, refreshed by the sync_replica command.
+    'replica': {
+        'ENGINE': 'BoardgameShop.sqlite3',
+        'NAME': os.environ.get('SQLITE_REPLICA_PATH', BASE_DIR / 'db.replica.sqlite3'),
+        'OPTIONS': SQLITE_OPTIONS,
+        'TEST': {
+            'NAME': BASE_DIR / 'test_replica.sqlite3',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['shop.replication.PrimaryReplicaRouter']
+
+# One cache for every worker process on the box, kept in its own SQLite database. Values read in the last
+# L1_TIMEOUT seconds are also kept in each process's memory.
+CACHES = {
+    'default': {
+        'BACKEND': 'BoardgameShop.cache.SQLiteCache',
+        'LOCATION': os.environ.get('SHOP_CACHE_PATH', BASE_DIR / 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+            'L1_TIMEOUT': 1,
+            'L1_MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+# Cache catalog pages for anonymous visitors for TIMEOUT seconds, then serve them stale for up to STALE_TIMEOUT
+# more while they are re-rendered in the background. Edits drop the affected pages at once. With SHELLS, logged-in
+# users get a cached shell of the page with their holes ({% hole %} tags) filled in per request.
+SHOP_PAGE_CACHE = {
+    'ENABLED': os.environ.get('SHOP_PAGE_CACHE', '') == '1',
+    'SHELLS': True,
+    'TIMEOUT': 60,
+    'STALE_TIMEOUT': 5 * 60,
+}
+
+# Serve catalog pages from the replica while it lags the primary by at most MAX_LAG seconds.
+SHOP_READ_REPLICA = {
+    'ENABLED': os.environ.get('SHOP_READ_REPLICA', '') == '1',
+    'ALIAS': 'replica',
+    'MAX_LAG': 30,
+}
+
+# Funnel cart, checkout and review writes through one writer thread per process that group-commits them.
+SHOP_WRITE_QUEUE = {
+    'ENABLED': os.environ.get('SHOP_WRITE_QUEUE', '') == '1',
+    'MAX_BATCH': 64,
+    'MAX_DELAY': 0.002,
+    'TIMEOUT': 30,
 }
 
 
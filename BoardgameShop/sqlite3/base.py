@@ -0,0 +1,44 @@
+"""
+SQLite backend tuned for a web workload: the stock backend plus per-connection PRAGMAs and a configurable
+BEGIN mode for transactions.
+
+OPTIONS takes two keys on top of the sqlite3.connect() ones:
+    'pragmas': {name: value}, run on every new connection, in order.
+    'transaction_mode': 'DEFERRED', 'IMMEDIATE' or 'EXCLUSIVE'. IMMEDIATE takes the write lock at BEGIN, so two
+        transactions never both read and then fail to upgrade to a write with "database is locked"; the second
+        one waits for busy_timeout instead.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    pragmas = {}
+    transaction_mode = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        transaction_mode = params.pop('transaction_mode', None)
+        if transaction_mode is not None:
+            transaction_mode = transaction_mode.upper()
+            if transaction_mode not in TRANSACTION_MODES:
+                raise ImproperlyConfigured(
+                    f"settings.DATABASES {self.alias!r} transaction_mode must be one of {', '.join(TRANSACTION_MODES)}."
+                )
+        self.transaction_mode = transaction_mode
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -1,11 +1,10 @@
 from django.contrib import admin
-from django.db.models import Avg
 
 from .models import Boardgame, Category, Publisher, Review
 
 
 class BoardgameAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'publisher')
+    list_display = ('name', 'price', 'publisher', 'rating_avg')
     search_fields = ('name',)
 
 
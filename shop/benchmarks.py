@@ -0,0 +1,224 @@
+import json
+import math
+import platform
+import time
+import tracemalloc
+from collections import namedtuple
+
+import django
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from shop.instrumentation import QueryRecorder
+from shop.models import Boardgame, CartBoardgame, Category, Order, Review
+
+DEFAULT_THRESHOLD = 0.25
+BENCHMARK_PASSWORD = 'perfdata'
+BENCHMARKED_URLCONFS = ('shop.urls', 'accounts.urls')
+
+# role is 'anonymous', 'user' or 'superuser'; a fresh session gets its own client, logged in outside the timing.
+Scenario = namedtuple('Scenario', 'name url_name method role args query data fresh_session max_iterations',
+                      defaults=((), '', None, False, None))
+
+SCENARIOS = (
+    Scenario('landing_page', 'landing_page', 'get', 'anonymous'),
+    Scenario('boardgames_list', 'boardgames_list', 'get', 'anonymous'),
+    Scenario('boardgames_list:search', 'boardgames_list', 'get', 'anonymous', query='q=dragon'),
+    Scenario('boardgames_list:facets', 'boardgames_list', 'get', 'anonymous', query='category={category}&players=2'),
+    Scenario('boardgame_details', 'boardgame_details', 'get', 'user', ('popular',)),
+    Scenario('boardgame_add', 'boardgame_add', 'get', 'superuser'),
+    Scenario('boardgame_update', 'boardgame_update', 'get', 'superuser', ('popular',)),
+    Scenario('boardgame_delete', 'boardgame_delete', 'post', 'superuser', ('unpopular',)),
+    Scenario('cart_list', 'cart_list', 'get', 'user'),
+    Scenario('add_boardgame_to_cart', 'add_boardgame_to_cart', 'get', 'user', ('popular',)),
+    Scenario('delete_boardgame_from_cart', 'delete_boardgame_from_cart', 'get', 'user', ('in_cart',)),
+    Scenario('make_order', 'make_order', 'post', 'user'),
+    Scenario('orders_list', 'orders_list', 'get', 'user'),
+    Scenario('order_detail', 'order_detail', 'get', 'user', ('order',)),
+    Scenario('review_add', 'review_add', 'get', 'user', ('unreviewed',)),
+    Scenario('review_add:post', 'review_add', 'post', 'user', ('unreviewed',),
+             data={'rating': 4, 'comment': 'Benchmark review.'}),
+    Scenario('review_detail', 'review_detail', 'get', 'user', ('review',)),
+    Scenario('review_update', 'review_update', 'get', 'user', ('review',)),
+    Scenario('review_update:post', 'review_update', 'post', 'user', ('review',),
+             data={'rating': 2, 'comment': 'Benchmark update.'}),
+    Scenario('review_delete', 'review_delete', 'post', 'user', ('review',)),
+    Scenario('reviews_list', 'reviews_list', 'get', 'anonymous', ('popular',)),
+    Scenario('profile_view', 'profile_view', 'get', 'user'),
+    Scenario('profile_edit', 'profile_edit', 'get', 'user'),
+    Scenario('export_catalog', 'export_catalog', 'get', 'superuser', max_iterations=3),
+    Scenario('export_orders', 'export_orders', 'get', 'superuser', max_iterations=3),
+    Scenario('sales_report', 'sales_report', 'get', 'superuser'),
+    Scenario('hole', 'hole', 'get', 'user', query='name=review_button&boardgame_pk={popular}'),
+    Scenario('boardgames_api', 'boardgames_api', 'get', 'anonymous'),
+    Scenario('register', 'register', 'get', 'anonymous'),
+    Scenario('register:post', 'register', 'post', 'anonymous',
+             data={'username': 'benchmark_new', 'email': 'benchmark_new@example.com',
+                   'password1': 'Benchmark-secret-1', 'password2': 'Benchmark-secret-1'}),
+    Scenario('login', 'login', 'get', 'anonymous'),
+    Scenario('login:post', 'login', 'post', 'anonymous',
+             data={'username': '{username}', 'password': BENCHMARK_PASSWORD}, fresh_session=True),
+    Scenario('logout', 'logout', 'get', 'user', fresh_session=True),
+)
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def missing_scenarios():
+    covered = {scenario.url_name for scenario in SCENARIOS}
+    names = set()
+    for urlconf in BENCHMARKED_URLCONFS:
+        names.update(pattern.name for pattern in get_resolver(urlconf).url_patterns if pattern.name)
+    return sorted(names - covered)
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def dataset_size():
+    return {model._meta.label: model.objects.count() for model in (Boardgame, CustomUser, Review, Order)}
+
+
+class BenchmarkRunner:
+    def __init__(self, iterations=20, warmup=2, scenarios=SCENARIOS):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.scenarios = scenarios
+        self.clients = {}
+
+    def _fixtures(self):
+        # A shopper with a cart, orders and reviews, so every user scenario has something to act on.
+        user = CustomUser.objects.filter(
+            Exists(Order.objects.filter(user=OuterRef('pk'))),
+            Exists(Review.objects.filter(user=OuterRef('pk'))),
+            Exists(CartBoardgame.objects.filter(cart__user=OuterRef('pk'))),
+            is_superuser=False,
+        ).order_by('id').first()
+        if user is None:
+            raise BenchmarkError('No user with a cart, an order and a review; run seed_perf_data first.')
+        user.set_password(BENCHMARK_PASSWORD)
+        user.save(update_fields=['password'])
+        superuser = CustomUser.objects.create_superuser('benchmark_admin', 'benchmark_admin@example.com')
+        reviewed = Review.objects.filter(user=user).values('boardgame_id')
+        self.users = {'user': user, 'superuser': superuser}
+        self.values = {
+            'username': user.username,
+            'popular': Boardgame.objects.order_by('-rating_count', 'id').values_list('id', flat=True).first(),
+            'unpopular': Boardgame.objects.order_by('rating_count', '-id').values_list('id', flat=True).first(),
+            'unreviewed': Boardgame.objects.exclude(id__in=reviewed).order_by('-rating_count', 'id')
+            .values_list('id', flat=True).first(),
+            'in_cart': CartBoardgame.objects.filter(cart__user=user).order_by('id')
+            .values_list('boardgame_id', flat=True).first(),
+            'order': Order.objects.filter(user=user).order_by('-date_ordered', '-id').values_list('id', flat=True)
+            .first(),
+            'review': Review.objects.filter(user=user).order_by('id').values_list('id', flat=True).first(),
+            'category': Category.objects.order_by('id').values_list('id', flat=True).first(),
+        }
+
+    def _client(self, role):
+        client = Client(raise_request_exception=False)
+        if role != 'anonymous':
+            client.force_login(self.users[role])
+        return client
+
+    def _request(self, scenario, trace=False):
+        url = reverse(scenario.url_name, args=[self.values[arg] for arg in scenario.args])
+        if scenario.query:
+            url = f'{url}?{scenario.query.format(**self.values)}'
+        data = {key: str(value).format(**self.values) for key, value in (scenario.data or {}).items()}
+        recorder = QueryRecorder()
+        peak = None
+        with transaction.atomic():
+            client = self._client(scenario.role) if scenario.fresh_session else self.clients[scenario.role]
+            if trace:
+                tracemalloc.start()
+            try:
+                with recorder:
+                    started = time.perf_counter()
+                    response = getattr(client, scenario.method)(url, data)
+                    if response.streaming:
+                        for _ in response.streaming_content:
+                            pass
+                    elapsed = time.perf_counter() - started
+                if trace:
+                    _, peak = tracemalloc.get_traced_memory()
+            finally:
+                if trace:
+                    tracemalloc.stop()
+            # Writes are undone after every request, so each iteration sees the same data.
+            transaction.set_rollback(True)
+        return response, elapsed, recorder.count, peak
+
+    def measure(self, scenario):
+        iterations = min(self.iterations, scenario.max_iterations or self.iterations)
+        for _ in range(min(self.warmup, iterations)):
+            self._request(scenario)
+        timings = [self._request(scenario)[1] for _ in range(iterations)]
+        # Memory is traced in a separate request, tracemalloc would skew the timings.
+        response, _, queries, peak = self._request(scenario, trace=True)
+        return {
+            'status': response.status_code,
+            'iterations': iterations,
+            'p50_ms': round(_percentile(timings, 0.5) * 1000, 3),
+            'p95_ms': round(_percentile(timings, 0.95) * 1000, 3),
+            'queries': queries,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def run(self, progress=None):
+        results = {}
+        # The whole run is rolled back as well, including the benchmark superuser and sessions.
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            self._fixtures()
+            self.clients = {role: self._client(role) for role in ('anonymous', 'user', 'superuser')}
+            for scenario in self.scenarios:
+                results[scenario.name] = self.measure(scenario)
+                if progress:
+                    progress(scenario.name, results[scenario.name])
+            transaction.set_rollback(True)
+        return {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'iterations': self.iterations,
+                'dataset': dataset_size(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'views': results,
+        }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for name, result in current['views'].items():
+        previous = baseline['views'].get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'peak_kb'):
+            if result[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f'{name}: {metric} {previous[metric]} -> {result[metric]}')
+        if result['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {result['queries']}")
+        if result['status'] != previous['status']:
+            regressions.append(f"{name}: status {previous['status']} -> {result['status']}")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def write_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump(results, stream, indent=2, sort_keys=True)
+        stream.write('\n')
@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F
+
+from shop.models import Boardgame, Cart, CartBoardgame
+
+CART_TABLE = Cart._meta.db_table
+LINE_TABLE = CartBoardgame._meta.db_table
+BOARDGAME_TABLE = Boardgame._meta.db_table
+CENT = Decimal('0.01')
+
+LINE_TOTAL = ExpressionWrapper(F('quantity') * F('boardgame__price'),
+                               output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+class CartSummary:
+    def __init__(self, cart, lines):
+        self.cart = cart
+        self.lines = lines
+        for line in lines:
+            # SQLite hands computed decimals back unquantized.
+            line.line_total = line.line_total.quantize(CENT)
+        self.total = sum((line.line_total for line in lines), Decimal('0.00'))
+        self.quantity = sum(line.quantity for line in lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+
+def load_cart(user):
+    cart, created = Cart.objects.get_or_create(user=user)
+    if created:
+        return CartSummary(cart, [])
+    lines = list(
+        CartBoardgame.objects.filter(cart=cart)
+        .select_related('boardgame')
+        .annotate(line_total=LINE_TOTAL)
+        .order_by('id')
+    )
+    return CartSummary(cart, lines)
+
+
+def _ensure_cart(cursor, user):
+    cursor.execute(
+        f'INSERT INTO {CART_TABLE} (user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING',
+        [user.pk],
+    )
+
+
+def _upsert_line(user, boardgame_pk, quantity, conflict_quantity):
+    # One INSERT ... SELECT ... ON CONFLICT statement: the SELECT resolves the cart and checks the boardgame
+    # exists, and the conflict clause turns a concurrent duplicate into an in-place update.
+    with transaction.atomic(), connection.cursor() as cursor:
+        _ensure_cart(cursor, user)
+        cursor.execute(
+            f'INSERT INTO {LINE_TABLE} (cart_id, boardgame_id, quantity) '
+            f'SELECT c.id, b.id, %s FROM {CART_TABLE} c, {BOARDGAME_TABLE} b '
+            f'WHERE c.user_id = %s AND b.id = %s '
+            f'ON CONFLICT (cart_id, boardgame_id) DO UPDATE SET quantity = {conflict_quantity}',
+            [quantity, user.pk, boardgame_pk],
+        )
+        if cursor.rowcount == 0:
+            raise Boardgame.DoesNotExist(f'Boardgame {boardgame_pk} does not exist.')
+
+
+def add_to_cart(user, boardgame_pk, quantity=1):
+    _upsert_line(user, boardgame_pk, quantity, f'{LINE_TABLE}.quantity + excluded.quantity')
+
+
+def set_cart_quantity(user, boardgame_pk, quantity):
+    if quantity <= 0:
+        remove_from_cart(user, boardgame_pk, quantity=None)
+        return
+    _upsert_line(user, boardgame_pk, quantity, 'excluded.quantity')
+
+
+def remove_from_cart(user, boardgame_pk, quantity=1):
+    lines = CartBoardgame.objects.filter(cart__user=user, boardgame_id=boardgame_pk)
+    with transaction.atomic():
+        if quantity is None:
+            lines.delete()
+            return
+        lines.update(quantity=F('quantity') - quantity)
+        lines.filter(quantity__lte=0).delete()
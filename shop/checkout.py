@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from django.db import connection, transaction
+
+from shop.models import Boardgame, Cart, CartBoardgame, Order, OrderBoardgame
+
+CART_TABLE = Cart._meta.db_table
+LINE_TABLE = CartBoardgame._meta.db_table
+BOARDGAME_TABLE = Boardgame._meta.db_table
+CENT = Decimal('0.01')
+
+
+def _claim_cart_lines(user):
+    # Deleting the lines is what claims them: of two concurrent checkouts of one cart, only the
+    # transaction whose DELETE removed the rows gets them back, the other sees an empty cart.
+    if connection.features.can_return_columns_from_insert:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {LINE_TABLE} '
+                f'WHERE cart_id IN (SELECT id FROM {CART_TABLE} WHERE user_id = %s) '
+                f'RETURNING boardgame_id, quantity, '
+                f'(SELECT price FROM {BOARDGAME_TABLE} WHERE id = {LINE_TABLE}.boardgame_id)',
+                [user.pk],
+            )
+            return [(boardgame_id, quantity, Decimal(str(price)).quantize(CENT))
+                    for boardgame_id, quantity, price in cursor.fetchall()]
+
+    lines = CartBoardgame.objects.select_for_update().filter(cart__user=user)
+    claimed = list(lines.values_list('boardgame_id', 'quantity', 'boardgame__price'))
+    lines.delete()
+    return claimed
+
+
+def place_order(user):
+    with transaction.atomic():
+        lines = _claim_cart_lines(user)
+        if not lines:
+            return None
+        total_amount = sum(quantity * unit_price for _, quantity, unit_price in lines)
+        order = Order.objects.create(user=user, total_amount=total_amount)
+        OrderBoardgame.objects.bulk_create(
+            OrderBoardgame(order=order, boardgame_id=boardgame_id, quantity=quantity, unit_price=unit_price)
+            for boardgame_id, quantity, unit_price in lines
+        )
+    return order
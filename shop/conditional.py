@@ -0,0 +1,88 @@
+import hashlib
+
+from django.db.models import Count, Max, Q
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from shop import pagecache
+from shop.models import Boardgame, Review
+from shop.versioning import CATALOG_VERSION, get_version
+
+
+def make_etag(*parts):
+    # Weak: equal ETags mean the same page, not byte-identical responses.
+    return 'W/' + quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+def viewer(request):
+    # Every page's navbar shows who is logged in, and superusers get extra buttons.
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    return user.pk, user.get_username(), user.is_superuser
+
+
+def catalog_validators(request):
+    # The catalog version is bumped on every boardgame, category and publisher change, deletions included.
+    last_modified = Boardgame.objects.aggregate(last=Max('updated_at'))['last']
+    return make_etag(get_version(CATALOG_VERSION), last_modified, viewer(request)), last_modified
+
+
+def catalog_api_validators(request):
+    last_modified = Boardgame.objects.aggregate(last=Max('updated_at'))['last']
+    return make_etag(get_version(CATALOG_VERSION), last_modified), last_modified
+
+
+def boardgame_validators(request, pk):
+    boardgames = Boardgame.objects.filter(pk=pk)
+    if request.user.is_authenticated:
+        # The page shows whether this user reviewed the game.
+        boardgames = boardgames.annotate(own_review=Max('review__updated_at', filter=Q(review__user=request.user)))
+        row = boardgames.values_list('updated_at', 'own_review').first()
+    else:
+        row = boardgames.values_list('updated_at').first()
+    if row is None:
+        return None, None
+    last_modified = max(value for value in row if value is not None)
+    labels = pagecache.tag_versions([pagecache.LABELS])
+    return make_etag(row, labels, viewer(request)), last_modified
+
+
+def reviews_validators(request, boardgame_pk):
+    reviews = Review.objects.filter(boardgame_id=boardgame_pk).order_by()
+    stats = reviews.aggregate(last=Max('updated_at'), count=Count('id'))
+    return make_etag(boardgame_pk, stats['last'], stats['count'], viewer(request)), stats['last']
+
+
+def not_modified(request, etag, last_modified):
+    """A 304 (or 412) response when the request's preconditions match the validators, otherwise None."""
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, last_modified):
+    if etag is not None and not response.has_header('ETag'):
+        response['ETag'] = etag
+    if last_modified is not None and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+class ConditionalGetMixin:
+    """Answers GET and HEAD with 304 Not Modified from the view's validators, before anything is rendered.
+
+    validators is a static function (request, **url_kwargs) returning an (etag, last_modified) pair.
+    """
+
+    validators = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        etag, last_modified = self.validators(request, **kwargs)
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            set_validators(response, etag, last_modified)
+        return response
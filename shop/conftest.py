@@ -1,9 +1,34 @@
+import copy
+from pathlib import Path
+
 import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
 
 from accounts.models import CustomUser
+from shop import facets, replication, sampling
+from shop.instrumentation import query_stats_recorded
 from shop.models import Boardgame, Category, Publisher, Review, Cart, Order, CartBoardgame, OrderBoardgame
 
 
+def _file_state(path):
+    return (path.stat().st_mtime_ns, path.stat().st_size) if path.exists() else None
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_cache(tmp_path_factory):
+    # The configured cache is shared with every running worker, and the tests clear it before each one.
+    configured = settings.CACHES['default']['LOCATION']
+    files = [Path(f'{configured}{suffix}') for suffix in ('', '-wal', '-shm')]
+    before = [_file_state(path) for path in files]
+    caches = copy.deepcopy(settings.CACHES)
+    caches['default']['LOCATION'] = tmp_path_factory.mktemp('cache') / 'cache.sqlite3'
+    with override_settings(CACHES=caches):
+        yield
+    assert [_file_state(path) for path in files] == before, f'The tests touched the configured cache {configured}.'
+
+
 @pytest.fixture
 def user():
     user = CustomUser.objects.create(username='test', email='test@op.pl')
@@ -70,5 +95,27 @@ def order(user):
 
 @pytest.fixture
 def order_boardgame(order, boardgame):
-    return OrderBoardgame.objects.create(order=order, boardgame=boardgame)
+    return OrderBoardgame.objects.create(order=order, boardgame=boardgame, unit_price=boardgame.price)
 
+
+@pytest.fixture(autouse=True)
+def reset_catalog_caches():
+    facets.reset()
+    sampling.reset()
+    replication.reset()
+    cache.clear()
+
+
+@pytest.fixture
+def query_budget():
+    recorded = []
+
+    def record(sender, stats, **kwargs):
+        recorded.append(stats)
+
+    query_stats_recorded.connect(record, weak=False)
+    yield recorded
+    query_stats_recorded.disconnect(record)
+    over_budget = [stats.describe() for stats in recorded if stats.over_budget]
+    if over_budget:
+        pytest.fail('Query budget exceeded:\n' + '\n'.join(over_budget), pytrace=False)
@@ -0,0 +1,114 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from shop.importing import CATEGORY_SEPARATOR
+from shop.models import Boardgame, Order, OrderBoardgame
+
+CATALOG_FIELDS = ('id', 'name', 'price', 'description', 'min_players_age', 'min_players', 'max_players',
+                  'min_game_time', 'max_game_time', 'is_available', 'rating_avg', 'rating_count')
+ORDER_FIELDS = ('id', 'user_id', 'user__username', 'date_ordered', 'total_amount')
+LINE_FIELDS = ('order_id', 'boardgame_id', 'boardgame__name', 'quantity', 'unit_price')
+
+CATALOG_COLUMNS = CATALOG_FIELDS + ('publisher', 'categories')
+ORDER_COLUMNS = ('order_id', 'user_id', 'username', 'date_ordered', 'order_total',
+                 'boardgame_id', 'boardgame_name', 'quantity', 'unit_price', 'line_total')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _batches(rows, size):
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def catalog_rows(chunk_size=2000):
+    boardgames = Boardgame.objects.order_by('id').values(*CATALOG_FIELDS, publisher_name=F('publisher__name'))
+    links = Boardgame.categories.through.objects.order_by('category__name')
+    for batch in _batches(boardgames.iterator(chunk_size=chunk_size), chunk_size):
+        categories = defaultdict(list)
+        for boardgame_id, name in links.filter(boardgame_id__in=[row['id'] for row in batch]).values_list(
+                'boardgame_id', 'category__name'):
+            categories[boardgame_id].append(name)
+        for row in batch:
+            row['publisher'] = row.pop('publisher_name')
+            row['categories'] = categories.get(row['id'], [])
+            yield row
+
+
+def order_rows(chunk_size=2000):
+    orders = Order.objects.order_by('id').values(*ORDER_FIELDS)
+    lines = OrderBoardgame.objects.order_by('id')
+    for batch in _batches(orders.iterator(chunk_size=chunk_size), chunk_size):
+        order_lines = defaultdict(list)
+        for line in lines.filter(order_id__in=[row['id'] for row in batch]).values(*LINE_FIELDS):
+            order_lines[line.pop('order_id')].append({
+                'boardgame_id': line['boardgame_id'],
+                'boardgame_name': line['boardgame__name'],
+                'quantity': line['quantity'],
+                'unit_price': line['unit_price'],
+                'line_total': line['quantity'] * line['unit_price'],
+            })
+        for row in batch:
+            yield {
+                'id': row['id'],
+                'user_id': row['user_id'],
+                'username': row['user__username'],
+                'date_ordered': row['date_ordered'],
+                'order_total': row['total_amount'],
+                'lines': order_lines.get(row['id'], []),
+            }
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_stream(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_catalog(export_format, chunk_size=2000):
+    rows = catalog_rows(chunk_size)
+    if export_format == 'ndjson':
+        return (json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+    return _csv_stream(CATALOG_COLUMNS, (
+        [row[field] for field in CATALOG_FIELDS] + [row['publisher'], CATEGORY_SEPARATOR.join(row['categories'])]
+        for row in rows
+    ))
+
+
+def stream_orders(export_format, chunk_size=2000):
+    rows = order_rows(chunk_size)
+    if export_format == 'ndjson':
+        return (json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+    return _csv_stream(ORDER_COLUMNS, _order_csv_rows(rows))
+
+
+def _order_csv_rows(rows):
+    empty_line = {'boardgame_id': '', 'boardgame_name': '', 'quantity': '', 'unit_price': '', 'line_total': ''}
+    for order in rows:
+        for line in order['lines'] or [empty_line]:
+            yield [order['id'], order['user_id'], order['username'], order['date_ordered'].isoformat(),
+                   order['order_total'], line['boardgame_id'], line['boardgame_name'], line['quantity'],
+                   line['unit_price'], line['line_total']]
+
+
+EXPORTS = {
+    'catalog': stream_catalog,
+    'orders': stream_orders,
+}
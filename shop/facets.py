@@ -0,0 +1,378 @@
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from shop import replication
+from shop.models import Boardgame, Category, Publisher
+from shop.versioning import CATALOG_VERSION, bump_version, bump_version_on_commit, get_version
+
+MAX_PLAYERS_FACET = 8
+# Values listed per facet, the rest behind a "more" link; selected values are always listed.
+FACET_LIMIT = 10
+EXPAND_PARAM = 'more'
+# Counts memoized per index for the selections browsed without a search query.
+MAX_MEMOIZED_SELECTIONS = 256
+
+PLAY_TIME_BUCKETS = (
+    ('under-30', 'Under 30 min', None, 30),
+    ('30-60', '30 - 60 min', 30, 60),
+    ('60-120', '1 - 2 h', 60, 120),
+    ('120-plus', 'Over 2 h', 120, None),
+)
+
+PRICE_BUCKETS = (
+    ('under-50', 'Under 50 PLN', None, Decimal(50)),
+    ('50-100', '50 - 100 PLN', Decimal(50), Decimal(100)),
+    ('100-200', '100 - 200 PLN', Decimal(100), Decimal(200)),
+    ('200-plus', 'Over 200 PLN', Decimal(200), None),
+)
+
+ROW_FIELDS = ('id', 'publisher_id', 'min_players', 'max_players', 'min_game_time', 'min_players_age', 'price')
+
+
+def _parse_int(raw):
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+class Facet(ABC):
+    sort_by_label = False
+
+    def __init__(self, name, label):
+        self.name = name
+        self.label = label
+
+    def parse(self, raw):
+        return _parse_int(raw)
+
+    @abstractmethod
+    def row_values(self, row):
+        pass
+
+    @abstractmethod
+    def condition(self, values):
+        pass
+
+    def value_label(self, value, labels):
+        return str(value)
+
+    def ordered(self, values):
+        return sorted(values)
+
+
+class FieldFacet(Facet):
+    def __init__(self, name, label, field, label_format='{}', sort_by_label=False):
+        super().__init__(name, label)
+        self.field = field
+        self.label_format = label_format
+        self.sort_by_label = sort_by_label
+
+    def row_values(self, row):
+        return (row[self.field],)
+
+    def condition(self, values):
+        return Q(**{f'{self.field}__in': values})
+
+    def value_label(self, value, labels):
+        if self.name in labels:
+            return labels[self.name].get(value, str(value))
+        return self.label_format.format(value)
+
+
+class CategoryFacet(Facet):
+    sort_by_label = True
+
+    def row_values(self, row):
+        return row['categories']
+
+    def condition(self, values):
+        through = Boardgame.categories.through.objects.filter(category_id__in=values)
+        return Q(id__in=through.values('boardgame_id'))
+
+    def value_label(self, value, labels):
+        return labels['category'].get(value, str(value))
+
+
+class PlayersFacet(Facet):
+    def parse(self, raw):
+        value = _parse_int(raw)
+        return value if value is not None and 1 <= value <= MAX_PLAYERS_FACET else None
+
+    def row_values(self, row):
+        if row['min_players'] > MAX_PLAYERS_FACET:
+            return (MAX_PLAYERS_FACET,)
+        return range(row['min_players'], min(row['max_players'], MAX_PLAYERS_FACET) + 1)
+
+    def condition(self, values):
+        condition = Q()
+        for value in values:
+            if value == MAX_PLAYERS_FACET:
+                condition |= Q(max_players__gte=value)
+            else:
+                condition |= Q(min_players__lte=value, max_players__gte=value)
+        return condition
+
+    def value_label(self, value, labels):
+        return f'{value}+' if value == MAX_PLAYERS_FACET else str(value)
+
+
+class RangeFacet(Facet):
+    def __init__(self, name, label, field, buckets):
+        super().__init__(name, label)
+        self.field = field
+        self.buckets = buckets
+
+    def parse(self, raw):
+        return raw if any(key == raw for key, _, _, _ in self.buckets) else None
+
+    def row_values(self, row):
+        value = row[self.field]
+        for key, _, low, high in self.buckets:
+            if (low is None or value >= low) and (high is None or value < high):
+                return (key,)
+        return ()
+
+    def condition(self, values):
+        condition = Q()
+        for key, _, low, high in self.buckets:
+            if key not in values:
+                continue
+            bucket = Q()
+            if low is not None:
+                bucket &= Q(**{f'{self.field}__gte': low})
+            if high is not None:
+                bucket &= Q(**{f'{self.field}__lt': high})
+            condition |= bucket
+        return condition
+
+    def value_label(self, value, labels):
+        return next(label for key, label, _, _ in self.buckets if key == value)
+
+    def ordered(self, values):
+        return [key for key, _, _, _ in self.buckets if key in values]
+
+
+FACETS = (
+    CategoryFacet('category', 'Categories'),
+    FieldFacet('publisher', 'Publisher', 'publisher_id', sort_by_label=True),
+    PlayersFacet('players', 'Players'),
+    RangeFacet('time', 'Game Time', 'min_game_time', PLAY_TIME_BUCKETS),
+    FieldFacet('age', 'Min. Age', 'min_players_age', label_format='{}+'),
+    RangeFacet('price', 'Price', 'price', PRICE_BUCKETS),
+)
+
+
+LABEL_MODELS = (('category', Category), ('publisher', Publisher))
+
+
+def bitset(pks):
+    bits = 0
+    for pk in pks:
+        bits |= 1 << pk
+    return bits
+
+
+class FacetIndex:
+    """One bitset of boardgame ids per facet value; counts are popcounts of intersections."""
+
+    def __init__(self, version):
+        self.version = version
+        self.universe = 0
+        self.bitsets = {facet.name: defaultdict(int) for facet in FACETS}
+        self.labels = {}
+        self.memoized = {}
+
+    @classmethod
+    def build(cls, version):
+        index = cls(version)
+        index.load()
+        return index
+
+    def load(self, pks=None):
+        boardgames = Boardgame.objects.order_by()
+        links = Boardgame.categories.through.objects.order_by()
+        if pks is not None:
+            boardgames = boardgames.filter(pk__in=pks)
+            links = links.filter(boardgame_id__in=pks)
+
+        categories = defaultdict(list)
+        for boardgame_id, category_id in links.values_list('boardgame_id', 'category_id').iterator(chunk_size=5000):
+            categories[boardgame_id].append(category_id)
+
+        labelled = {'category': set(), 'publisher': set()}
+        for row in boardgames.values(*ROW_FIELDS).iterator(chunk_size=5000):
+            row['categories'] = categories.get(row['id'], ())
+            labelled['category'].update(row['categories'])
+            labelled['publisher'].add(row['publisher_id'])
+            bit = 1 << row['id']
+            self.universe |= bit
+            for facet in FACETS:
+                bitsets = self.bitsets[facet.name]
+                for value in facet.row_values(row):
+                    bitsets[value] |= bit
+
+        if pks is None:
+            self.labels = {name: dict(model.objects.values_list('id', 'name')) for name, model in LABEL_MODELS}
+        else:
+            # Renames rebuild the whole index, so only labels of categories and publishers new to it are read.
+            for name, model in LABEL_MODELS:
+                missing = labelled[name] - self.labels[name].keys()
+                if missing:
+                    names = dict(model.objects.filter(pk__in=missing).values_list('id', 'name'))
+                    self.labels = {**self.labels, name: {**self.labels[name], **names}}
+
+    def patched(self, pks, version):
+        """A copy with these boardgames reloaded. Requests may be evaluating this index, so it is never changed."""
+        index = FacetIndex(version)
+        mask = ~bitset(pks)
+        index.universe = self.universe & mask
+        index.labels = self.labels
+        for name, bitsets in self.bitsets.items():
+            for value, bits in bitsets.items():
+                bits &= mask
+                if bits:
+                    index.bitsets[name][value] = bits
+        index.load(pks)
+        return index
+
+    def evaluate(self, selection, base=None):
+        if base is not None:
+            return self._evaluate(selection, base)
+        # The index is never changed once built, so its counts for a selection stay right.
+        key = tuple(sorted((name, tuple(sorted(values, key=str))) for name, values in selection.items()))
+        result = self.memoized.get(key)
+        if result is None:
+            if len(self.memoized) >= MAX_MEMOIZED_SELECTIONS:
+                self.memoized.clear()
+            result = self.memoized[key] = self._evaluate(selection, base)
+        return result
+
+    def _evaluate(self, selection, base):
+        universe = self.universe if base is None else self.universe & base
+        masks = {}
+        for name, values in selection.items():
+            mask = 0
+            for value in values:
+                mask |= self.bitsets[name].get(value, 0)
+            masks[name] = mask
+
+        matching = universe
+        for mask in masks.values():
+            matching &= mask
+
+        counts = {}
+        for facet in FACETS:
+            # A facet is counted against every other facet's selection, so its own alternatives stay visible.
+            scope = universe
+            for name, mask in masks.items():
+                if name != facet.name:
+                    scope &= mask
+            counts[facet.name] = {value: (bits & scope).bit_count() for value, bits in self.bitsets[facet.name].items()}
+        return matching.bit_count(), counts
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    version = get_version(CATALOG_VERSION)
+    index = _index
+    if index is None or index.version != version:
+        with _lock:
+            if _index is None or _index.version != version:
+                # Built from the primary, a lagging replica would cache stale bitsets under the current version.
+                with replication.primary():
+                    _index = FacetIndex.build(version)
+            index = _index
+    return index
+
+
+def refresh_boardgames(pks):
+    pks = set(pks)
+
+    def apply():
+        global _index
+        version = bump_version(CATALOG_VERSION)
+        with _lock:
+            if _index is not None and version is not None and _index.version == version - 1:
+                with replication.primary():
+                    _index = _index.patched(pks, version)
+
+    if pks:
+        transaction.on_commit(apply)
+
+
+def invalidate():
+    bump_version_on_commit(CATALOG_VERSION)
+
+
+def reset():
+    global _index
+    _index = None
+
+
+def parse_selection(query_dict):
+    selection = {}
+    for facet in FACETS:
+        values = {facet.parse(raw) for raw in query_dict.getlist(facet.name)} - {None}
+        if values:
+            selection[facet.name] = values
+    return selection
+
+
+def filter_boardgames(queryset, selection):
+    for facet in FACETS:
+        if facet.name in selection:
+            queryset = queryset.filter(facet.condition(selection[facet.name]))
+    return queryset
+
+
+def _shown_values(facet_counts, selected, expanded):
+    values = [value for value, count in facet_counts.items() if count or value in selected]
+    if expanded or len(values) <= FACET_LIMIT:
+        return values, 0
+    top = sorted(values, key=lambda value: -facet_counts.get(value, 0))[:FACET_LIMIT]
+    shown = set(top) | selected
+    return [value for value in values if value in shown], len(values) - len(shown)
+
+
+def summarize(selection, query_dict, base=None):
+    index = get_index()
+    total, counts = index.evaluate(selection, base)
+    expanded = query_dict.get(EXPAND_PARAM)
+    summary = []
+    for facet in FACETS:
+        selected = selection.get(facet.name, set())
+        facet_counts = counts[facet.name]
+        shown, hidden = _shown_values(facet_counts, selected, facet.name == expanded)
+        values = []
+        for value in facet.ordered(shown):
+            params = query_dict.copy()
+            params.pop('cursor', None)
+            params.pop(EXPAND_PARAM, None)
+            params.setlist(facet.name, sorted(str(item) for item in selected ^ {value}))
+            values.append({
+                'value': value,
+                'label': facet.value_label(value, index.labels),
+                'count': facet_counts.get(value, 0),
+                'selected': value in selected,
+                'url': f'?{params.urlencode()}',
+            })
+        if facet.sort_by_label:
+            values.sort(key=lambda item: item['label'].lower())
+        more_url = None
+        if hidden:
+            params = query_dict.copy()
+            params[EXPAND_PARAM] = facet.name
+            more_url = f'?{params.urlencode()}'
+        summary.append({'name': facet.name, 'label': facet.label, 'values': values, 'hidden': hidden,
+                        'more_url': more_url})
+    return summary, total
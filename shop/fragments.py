@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from shop import replication
+from shop.versioning import bump_versions_on_commit, get_versions
+
+CARDS_VERSION = 'shop:cards:version'
+CARD_VERSION_KEY = 'shop:card:{pk}:version'
+CARD_KEY = 'shop:card:{variant}:{pk}:{generation}.{version}'
+CARD_TEMPLATE = 'shop/boardgame_card.html'
+CARD_TIMEOUT = 24 * 60 * 60
+
+# Superusers get the edit and delete buttons; no other per-user content is rendered into a card.
+PUBLIC = 'public'
+SUPERUSER = 'superuser'
+
+
+def card_variant(user):
+    return SUPERUSER if user.is_superuser else PUBLIC
+
+
+def render_cards(boardgames, variant):
+    """The HTML of each boardgame's card, rendering and caching only those missing from the cache."""
+    version_keys = {boardgame.pk: CARD_VERSION_KEY.format(pk=boardgame.pk) for boardgame in boardgames}
+    versions = get_versions([CARDS_VERSION, *version_keys.values()])
+    keys = {
+        pk: CARD_KEY.format(variant=variant, pk=pk, generation=versions[CARDS_VERSION], version=versions[key])
+        for pk, key in version_keys.items()
+    }
+    cards = cache.get_many(keys.values())
+    rendered = {}
+    for boardgame in boardgames:
+        key = keys[boardgame.pk]
+        if key not in cards:
+            rendered[key] = cards[key] = render_to_string(CARD_TEMPLATE, {
+                'boardgame': boardgame, 'superuser': variant == SUPERUSER,
+            })
+    if rendered:
+        # A card read from a lagging replica may predate the current version, so it only lives as long as the lag.
+        timeout = replication.get_options().get('MAX_LAG', 30) if replication.is_reading_replica() else CARD_TIMEOUT
+        cache.set_many(rendered, timeout)
+    return [mark_safe(cards[keys[boardgame.pk]]) for boardgame in boardgames]
+
+
+def invalidate_cards(pks):
+    bump_versions_on_commit(CARD_VERSION_KEY.format(pk=pk) for pk in set(pks))
+
+
+def invalidate_all():
+    bump_versions_on_commit([CARDS_VERSION])
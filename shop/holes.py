@@ -0,0 +1,50 @@
+import re
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from shop.models import Review
+
+# Template output can't forge a placeholder: autoescaping turns '<' into '&lt;'.
+PLACEHOLDER = '<!--hole:{name}?{query}-->'
+PLACEHOLDER_RE = re.compile(r'<!--hole:(\w+)\?([^>]*)-->')
+
+Hole = namedtuple('Hole', 'template get_context')
+
+
+def review_button_context(request, boardgame_pk):
+    review = None
+    if request.user.is_authenticated:
+        review = Review.objects.filter(user=request.user, boardgame_id=boardgame_pk).only('pk').first()
+    context = {'boardgame_pk': int(boardgame_pk), 'is_reviewed': review is not None}
+    if review is not None:
+        context['review'] = review
+    return context
+
+
+# The per-visitor parts of otherwise shared pages; the context function gets the request and the hole's arguments.
+HOLES = {
+    'account_nav': Hole('shop/holes/account_nav.html', lambda request: {}),
+    'review_button': Hole('shop/holes/review_button.html', review_button_context),
+}
+
+
+def placeholder(name, kwargs):
+    if name not in HOLES:
+        raise ValueError(f'Unknown hole {name!r}.')
+    return mark_safe(PLACEHOLDER.format(name=name, query=urlencode(sorted(kwargs.items()))))
+
+
+def render_hole(request, name, kwargs):
+    hole = HOLES[name]
+    return render_to_string(hole.template, hole.get_context(request, **kwargs), request=request)
+
+
+def fill_holes(content, request):
+    """Render the holes of a cached page shell for the visitor of this request."""
+    text = content.decode()
+    if '<!--hole:' not in text:
+        return content
+    return PLACEHOLDER_RE.sub(lambda match: render_hole(request, match[1], dict(parse_qsl(match[2]))), text).encode()
@@ -0,0 +1,211 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from shop import facets, fragments, pagecache, search
+from shop.models import Boardgame, Category, Publisher
+
+CATEGORY_SEPARATOR = '|'
+INTEGER_FIELDS = ('min_players_age', 'min_players', 'max_players', 'min_game_time')
+UPDATE_FIELDS = ('price', 'description', 'min_players_age', 'min_players', 'max_players',
+                 'min_game_time', 'max_game_time', 'is_available')
+# Past this many, skipped rows are only counted, so a large bad feed doesn't pile up messages in memory.
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        row['categories'] = [name for name in (row.get('categories') or '').split(CATEGORY_SEPARATOR) if name.strip()]
+        yield row
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            # Yielded rather than raised, so the row is skipped and the rest of the feed still imports.
+            yield ImportRowError(f'invalid JSON: {error.msg}')
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def _text(row, field, max_length=None):
+    value = str(row.get(field) or '').strip()
+    if not value:
+        raise ImportRowError(f'{field} is required')
+    if max_length and len(value) > max_length:
+        raise ImportRowError(f'{field} is longer than {max_length} characters')
+    return value
+
+
+def _integer(value, field):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ImportRowError(f'{field} must be an integer')
+
+
+def _validated(field, value):
+    # The model's validators, which bulk inserts skip, e.g. minimum player counts and the price's digits.
+    try:
+        Boardgame._meta.get_field(field).run_validators(value)
+    except ValidationError as error:
+        raise ImportRowError(f'{field}: {" ".join(error.messages)}')
+    return value
+
+
+def _price(value):
+    try:
+        price = Decimal(str(value))
+        if not price.is_finite():
+            raise InvalidOperation
+        price = price.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ImportRowError('price must be a number')
+    return _validated('price', price)
+
+
+def _boolean(value):
+    if value in (None, ''):
+        return True
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ('0', 'false', 'no', 'n')
+
+
+def parse_row(row):
+    if isinstance(row, ImportRowError):
+        raise row
+    if not isinstance(row, dict):
+        raise ImportRowError('row must be an object')
+    max_game_time = row.get('max_game_time')
+    return {
+        'name': _text(row, 'name', 100),
+        'publisher': _text(row, 'publisher', 50),
+        'categories': sorted({str(name).strip()[:50] for name in row.get('categories') or ()}),
+        'price': _price(row.get('price')),
+        'description': str(row.get('description') or ''),
+        **{field: _validated(field, _integer(row.get(field), field)) for field in INTEGER_FIELDS},
+        'max_game_time': (_validated('max_game_time', _integer(max_game_time, 'max_game_time'))
+                          if max_game_time not in (None, '') else None),
+        'is_available': _boolean(row.get('is_available')),
+    }
+
+
+class BoardgameImporter:
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.publishers = {}
+        self.categories = {}
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.errors = []
+
+    def run(self, rows, progress=None):
+        rows = enumerate(rows, start=1)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+            if progress:
+                progress(self)
+        facets.invalidate()
+        pagecache.invalidate(pagecache.LABELS)
+        return self
+
+    @property
+    def processed(self):
+        return self.created + self.updated
+
+    def import_chunk(self, chunk):
+        parsed = {}
+        for line_number, row in chunk:
+            try:
+                data = parse_row(row)
+            except ImportRowError as error:
+                self.skipped += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append((line_number, str(error)))
+                continue
+            # The last occurrence of a (publisher, name) pair in a chunk wins, as it would row by row.
+            parsed[(data['publisher'], data['name'])] = data
+        if not parsed:
+            return
+
+        with transaction.atomic():
+            self._resolve(Publisher, self.publishers, {data['publisher'] for data in parsed.values()})
+            self._resolve(Category, self.categories,
+                          {name for data in parsed.values() for name in data['categories']})
+            boardgames = self._upsert_boardgames(parsed.values())
+            self._replace_categories(boardgames)
+            search.index_boardgames([boardgame.pk for boardgame, _ in boardgames])
+            fragments.invalidate_cards([boardgame.pk for boardgame, _ in boardgames])
+            pagecache.invalidate_boardgames([boardgame.pk for boardgame, _ in boardgames])
+
+    def _resolve(self, model, known, names):
+        missing = names - known.keys()
+        if not missing:
+            return
+        model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+        known.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+
+    def _upsert_boardgames(self, rows):
+        keys = {(self.publishers[data['publisher']], data['name']) for data in rows}
+        existing = {
+            (publisher_id, name): pk
+            for pk, publisher_id, name in Boardgame.objects.filter(
+                publisher_id__in={publisher_id for publisher_id, _ in keys},
+                name__in={name for _, name in keys},
+            ).order_by('id').values_list('id', 'publisher_id', 'name')
+        }
+
+        to_create, to_update, boardgames = [], [], []
+        for data in rows:
+            publisher_id = self.publishers[data['publisher']]
+            boardgame = Boardgame(
+                pk=existing.get((publisher_id, data['name'])),
+                name=data['name'],
+                publisher_id=publisher_id,
+                **{field: data[field] for field in UPDATE_FIELDS},
+            )
+            (to_update if boardgame.pk else to_create).append(boardgame)
+            boardgames.append((boardgame, data['categories']))
+
+        Boardgame.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        # An INSERT ... ON CONFLICT (id) DO UPDATE upsert, much cheaper than bulk_update()'s per-row CASE WHEN.
+        Boardgame.objects.bulk_create(to_update, batch_size=self.chunk_size, update_conflicts=True,
+                                      unique_fields=['id'], update_fields=[*UPDATE_FIELDS, 'updated_at'])
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        return boardgames
+
+    def _replace_categories(self, boardgames):
+        through = Boardgame.categories.through
+        through.objects.filter(boardgame_id__in=[boardgame.pk for boardgame, _ in boardgames]).delete()
+        through.objects.bulk_create(
+            [
+                through(boardgame_id=boardgame.pk, category_id=self.categories[name])
+                for boardgame, category_names in boardgames
+                for name in category_names
+            ],
+            batch_size=self.chunk_size,
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,134 @@
+import logging
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connections
+from django.dispatch import Signal, receiver
+
+logger = logging.getLogger(__name__)
+
+query_stats_recorded = Signal()
+
+DB_ERROR_HEADER = 'X-DB-Error'
+LOCKED = 'locked'
+
+
+def get_budget(url_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+
+
+class QueryRecorder:
+    def __init__(self, using=None):
+        self.using = using
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        aliases = [self.using] if self.using else list(connections)
+        for alias in aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    @property
+    def duplicates(self):
+        # Same SQL with placeholders run more than once, the usual shape of an N+1.
+        counts = Counter(sql for sql, _ in self.queries)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+
+class QueryStats:
+    def __init__(self, url_name, path, recorder):
+        self.url_name = url_name
+        self.path = path
+        self.count = recorder.count
+        self.duration = recorder.duration
+        self.duplicates = recorder.duplicates
+        self.budget = get_budget(url_name)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def describe(self):
+        lines = [f'{self.url_name} ({self.path}): {self.count} queries, budget {self.budget}, '
+                 f'{self.duration * 1000:.1f} ms']
+        lines += [f'  {count}x {sql}' for sql, count in self.duplicates.items()]
+        return '\n'.join(lines)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is None or not match.url_name:
+            return response
+
+        # Streaming bodies query after this returns, so only the view's own queries are counted for them.
+        stats = QueryStats(match.url_name, request.path, recorder)
+        response.query_stats = stats
+        query_stats_recorded.send(sender=self.__class__, stats=stats)
+        if stats.over_budget:
+            logger.warning('Query budget exceeded: %s', stats.describe())
+        else:
+            logger.debug('%s', stats.describe())
+
+        if settings.DEBUG:
+            response['X-DB-Query-Count'] = stats.count
+            response['X-DB-Time-Ms'] = f'{stats.duration * 1000:.1f}'
+            response['X-DB-Duplicate-Queries'] = sum(stats.duplicates.values()) - len(stats.duplicates)
+            if stats.budget is not None:
+                response['X-DB-Query-Budget'] = stats.budget
+        return response
+
+
+def is_locked_error(error):
+    return isinstance(error, OperationalError) and 'database is locked' in str(error)
+
+
+@receiver(got_request_exception)
+def request_failed(sender, request=None, **kwargs):
+    # Sent while the exception is being handled, wherever in the middleware stack it was raised.
+    if request is not None and is_locked_error(sys.exc_info()[1]):
+        request.db_error = LOCKED
+
+
+class DatabaseErrorMiddleware:
+    """Tags responses to requests that failed on a locked database with X-DB-Error: locked, so load tests can tell
+    lock errors from other 500s without the DEBUG error page."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        error = getattr(request, 'db_error', None)
+        if error is not None:
+            response[DB_ERROR_HEADER] = error
+        return response
@@ -0,0 +1,272 @@
+import asyncio
+import random
+import re
+import time
+from collections import Counter
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import reverse
+
+from shop.instrumentation import DB_ERROR_HEADER, LOCKED
+from shop.seeding import WORDS
+
+CSRF_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+HISTOGRAM_BOUNDS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+PERCENTILES = (50, 90, 95, 99)
+
+# Share of journeys that go on to each optional step.
+SEARCH_RATIO = 0.5
+ADD_TO_CART_RATIO = 0.35
+CHECKOUT_RATIO = 0.5
+REVIEW_RATIO = 0.1
+
+
+class RequestFailed(Exception):
+    def __init__(self, kind):
+        super().__init__(kind)
+        self.kind = kind
+
+
+class HttpSession:
+    """A cookie-keeping HTTP/1.1 keep-alive connection, enough to walk the shop like a browser."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, data=None):
+        try:
+            return await asyncio.wait_for(self._request(method, path, data), self.timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise RequestFailed('timeout')
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            await self.close()
+            raise RequestFailed('connection')
+
+    async def _request(self, method, path, data):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = urlencode(data).encode() if data is not None else b''
+        headers = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: keep-alive']
+        if self.cookies:
+            headers.append('Cookie: ' + '; '.join(f'{name}={value}' for name, value in self.cookies.items()))
+        if data is not None:
+            headers += ['Content-Type: application/x-www-form-urlencoded', f'Content-Length: {len(body)}']
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readuntil(b'\r\n')).split()[1])
+        response_headers = {}
+        while (line := await self.reader.readuntil(b'\r\n')) != b'\r\n':
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                self._store_cookie(value)
+            else:
+                response_headers[name] = value
+
+        if 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding') == 'chunked':
+            content = await self._read_chunked()
+        else:
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, response_headers, content
+
+    async def _read_chunked(self):
+        chunks = []
+        while size := int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16):
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+        await self.reader.readuntil(b'\r\n')
+        return b''.join(chunks)
+
+    def _store_cookie(self, header):
+        for name, morsel in SimpleCookie(header).items():
+            if morsel.value and morsel['max-age'] != '0':
+                self.cookies[name] = morsel.value
+            else:
+                self.cookies.pop(name, None)
+
+
+class StepStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = Counter()
+
+    @property
+    def requests(self):
+        return len(self.latencies) + sum(self.errors.values())
+
+    def percentile(self, percent):
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))]
+
+    def histogram(self):
+        counts = Counter()
+        for latency in self.latencies:
+            bound = next((bound for bound in HISTOGRAM_BOUNDS_MS if latency * 1000 < bound), None)
+            counts[bound] += 1
+        return [(bound, counts[bound]) for bound in HISTOGRAM_BOUNDS_MS + (None,)]
+
+
+class LoadTest:
+    def __init__(self, base_url, usernames, password, concurrency=20, duration=60, ramp_up=5, think_time=0,
+                 timeout=30, seed=0):
+        self.base_url = base_url
+        self.usernames = usernames
+        self.password = password
+        self.concurrency = concurrency
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.timeout = timeout
+        self.seed = seed
+        self.steps = {}
+        self.journeys = 0
+        self.elapsed = 0
+        self.paths = {
+            'login': reverse('login'),
+            'browse': reverse('boardgames_list'),
+            'cart': reverse('cart_list'),
+            'checkout': reverse('make_order'),
+        }
+        self.detail_re = self._link_re('boardgame_details')
+        self.review_re = self._link_re('review_add')
+
+    @staticmethod
+    def _link_re(url_name):
+        marker = '999999999'
+        return re.compile(re.escape(reverse(url_name, args=[marker])).replace(marker, r'(\d+)').encode())
+
+    async def step(self, session, name, method, path, data=None):
+        stats = self.steps.setdefault(name, StepStats())
+        started = time.perf_counter()
+        try:
+            status, headers, body = await session.request(method, path, data)
+        except RequestFailed as error:
+            stats.errors[error.kind] += 1
+            raise
+        elapsed = time.perf_counter() - started
+        if status >= 500:
+            kind = LOCKED if headers.get(DB_ERROR_HEADER.lower()) == LOCKED else f'http_{status}'
+        elif status >= 400:
+            kind = f'http_{status}'
+        elif status in (301, 302) and headers.get('location', '').startswith(self.paths['login']):
+            kind = 'logged_out'
+        else:
+            stats.latencies.append(elapsed)
+            return body
+        stats.errors[kind] += 1
+        raise RequestFailed(kind)
+
+    def _csrf(self, body):
+        match = CSRF_RE.search(body)
+        if match is None:
+            raise RequestFailed('no_csrf_token')
+        return match.group(1).decode()
+
+    async def login(self, session, username):
+        body = await self.step(session, 'login_form', 'GET', self.paths['login'])
+        await self.step(session, 'login', 'POST', self.paths['login'], {
+            'csrfmiddlewaretoken': self._csrf(body), 'username': username, 'password': self.password,
+        })
+
+    async def journey(self, session, rng):
+        body = await self.step(session, 'browse', 'GET', self.paths['browse'])
+        ids = self.detail_re.findall(body)
+        if rng.random() < SEARCH_RATIO:
+            query = urlencode({'q': rng.choice(WORDS)})
+            body = await self.step(session, 'search', 'GET', f"{self.paths['browse']}?{query}")
+            ids = self.detail_re.findall(body) or ids
+        if not ids:
+            return
+        boardgame_pk = int(rng.choice(ids))
+        body = await self.step(session, 'detail', 'GET', reverse('boardgame_details', args=[boardgame_pk]))
+        can_review = bool(self.review_re.search(body))
+
+        if rng.random() < ADD_TO_CART_RATIO:
+            await self.step(session, 'add_to_cart', 'GET', reverse('add_boardgame_to_cart', args=[boardgame_pk]))
+            body = await self.step(session, 'cart', 'GET', self.paths['cart'])
+            if rng.random() < CHECKOUT_RATIO:
+                await self.step(session, 'checkout', 'POST', self.paths['checkout'],
+                                {'csrfmiddlewaretoken': self._csrf(body)})
+
+        if can_review and rng.random() < REVIEW_RATIO:
+            path = reverse('review_add', args=[boardgame_pk])
+            body = await self.step(session, 'review_form', 'GET', path)
+            await self.step(session, 'review', 'POST', path, {
+                'csrfmiddlewaretoken': self._csrf(body), 'rating': rng.randint(1, 5), 'comment': 'Load test review.',
+            })
+
+    async def virtual_user(self, index, deadline):
+        rng = random.Random(f'{self.seed}:{index}')
+        await asyncio.sleep(self.ramp_up * index / self.concurrency)
+        session = HttpSession(self.base_url, self.timeout)
+        try:
+            logged_in = False
+            while time.monotonic() < deadline:
+                try:
+                    if not logged_in:
+                        await self.login(session, self.usernames[index % len(self.usernames)])
+                        logged_in = True
+                    await self.journey(session, rng)
+                    self.journeys += 1
+                except RequestFailed as error:
+                    # A failed step ends the journey, the virtual user starts a new one.
+                    logged_in = logged_in and error.kind != 'logged_out'
+                if self.think_time:
+                    await asyncio.sleep(rng.expovariate(1 / self.think_time))
+        finally:
+            await session.close()
+
+    async def _run(self):
+        started = time.monotonic()
+        deadline = started + self.ramp_up + self.duration
+        await asyncio.gather(*(self.virtual_user(index, deadline) for index in range(self.concurrency)))
+        self.elapsed = time.monotonic() - started
+
+    def run(self):
+        asyncio.run(self._run())
+        return self
+
+    def summary(self):
+        elapsed = self.elapsed or 1
+        steps = {}
+        for name, stats in self.steps.items():
+            steps[name] = {
+                'requests': stats.requests,
+                'rps': round(stats.requests / elapsed, 2),
+                'errors': dict(stats.errors),
+                'error_rate': round(sum(stats.errors.values()) / stats.requests, 4) if stats.requests else 0,
+                **{f'p{percent}_ms': round(stats.percentile(percent) * 1000, 2) if stats.latencies else None
+                   for percent in PERCENTILES},
+                'max_ms': round(max(stats.latencies) * 1000, 2) if stats.latencies else None,
+                'histogram': [[bound, count] for bound, count in stats.histogram()],
+            }
+        requests = sum(step['requests'] for step in steps.values())
+        return {
+            'concurrency': self.concurrency,
+            'elapsed_s': round(self.elapsed, 2),
+            'requests': requests,
+            'rps': round(requests / elapsed, 2),
+            'journeys': self.journeys,
+            'journeys_per_s': round(self.journeys / elapsed, 2),
+            'steps': steps,
+        }
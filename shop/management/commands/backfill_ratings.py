@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from shop.models import Boardgame
+from shop.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating sum, count and average of every boardgame from its reviews.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of boardgame ids recomputed per transaction.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        bounds = Boardgame.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write('No boardgames to backfill.')
+            return
+
+        started = time.monotonic()
+        updated = 0
+        for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+            with transaction.atomic():
+                updated += recompute_ratings(Boardgame.objects.filter(id__gte=start, id__lt=start + chunk_size))
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfilled ratings of {updated} boardgames in {time.monotonic() - started:.2f}s.'))
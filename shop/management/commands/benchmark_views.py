@@ -0,0 +1,57 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.benchmarks import (DEFAULT_THRESHOLD, SCENARIOS, BenchmarkError, BenchmarkRunner, compare, load_baseline,
+                             missing_scenarios, write_baseline)
+
+
+class Command(BaseCommand):
+    help = ('Drive every shop and accounts URL through the test client against the current (seeded) database, '
+            'and compare p50/p95 latency, query count and peak memory with a stored baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'benchmark_baseline.json'),
+                            help='Baseline JSON file, written on the first run.')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per view.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per view before timing.')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Allowed relative slowdown before a view counts as regressed, 0.25 for 25%%.')
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Only run these scenarios.')
+        parser.add_argument('--update-baseline', action='store_true', help='Store this run as the new baseline.')
+
+    def handle(self, *args, **options):
+        for url_name in missing_scenarios():
+            self.stderr.write(f'No benchmark scenario for URL {url_name!r}.')
+        scenarios = SCENARIOS
+        if options['only']:
+            unknown = set(options['only']) - {scenario.name for scenario in SCENARIOS}
+            if unknown:
+                raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}.')
+            scenarios = [scenario for scenario in SCENARIOS if scenario.name in options['only']]
+
+        def progress(name, result):
+            self.stdout.write(f"{name:<28} {result['status']} p50 {result['p50_ms']:>9.2f} ms  "
+                              f"p95 {result['p95_ms']:>9.2f} ms  {result['queries']:>3} queries  "
+                              f"{result['peak_kb']:>9.1f} KiB")
+
+        runner = BenchmarkRunner(iterations=options['iterations'], warmup=options['warmup'], scenarios=scenarios)
+        try:
+            current = runner.run(progress)
+        except BenchmarkError as error:
+            raise CommandError(str(error))
+
+        path = Path(options['baseline'])
+        if options['update_baseline'] or not path.exists():
+            write_baseline(path, current)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {path}.'))
+            return
+
+        baseline = load_baseline(path)
+        if baseline['meta'].get('dataset') != current['meta']['dataset']:
+            self.stderr.write('The dataset differs from the one the baseline was recorded on.')
+        regressions = compare(baseline, current, options['threshold'])
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}.'))
@@ -0,0 +1,6 @@
+from shop.management.export import ExportCommand
+
+
+class Command(ExportCommand):
+    help = 'Stream the catalog export as CSV or NDJSON.'
+    export = 'catalog'
@@ -0,0 +1,6 @@
+from shop.management.export import ExportCommand
+
+
+class Command(ExportCommand):
+    help = 'Stream the orders export as CSV or NDJSON.'
+    export = 'orders'
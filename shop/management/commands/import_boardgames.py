@@ -0,0 +1,49 @@
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.importing import READERS, BoardgameImporter
+
+
+class Command(BaseCommand):
+    help = 'Stream boardgames from a CSV or JSONL file, upserting publishers, categories and boardgames in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' to read from stdin.")
+        parser.add_argument('--format', choices=sorted(READERS), help='Input format, guessed from the extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of rows written per transaction.')
+
+    def handle(self, *args, **options):
+        input_format = options['format'] or self._guess_format(options['path'])
+        reader = READERS[input_format]
+        importer = BoardgameImporter(chunk_size=options['chunk_size'])
+        started = time.monotonic()
+
+        def progress(importer):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{importer.processed} rows imported ({importer.processed / elapsed:.0f} rows/s)')
+
+        if options['path'] == '-':
+            importer.run(reader(sys.stdin), progress)
+        else:
+            with open(options['path'], newline='', encoding='utf-8') as stream:
+                importer.run(reader(stream), progress)
+
+        for line_number, error in importer.errors:
+            self.stderr.write(f'Row {line_number} skipped: {error}')
+        if importer.skipped > len(importer.errors):
+            self.stderr.write(f'{importer.skipped - len(importer.errors)} more rows skipped.')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {importer.created} and updated {importer.updated} boardgames in {elapsed:.2f}s '
+            f'({importer.processed / elapsed if elapsed else 0:.0f} rows/s), {importer.skipped} rows skipped.'))
+
+    def _guess_format(self, path):
+        suffix = Path(path).suffix.lower().lstrip('.')
+        if suffix == 'ndjson':
+            suffix = 'jsonl'
+        if suffix not in READERS:
+            raise CommandError('Cannot guess the input format, use --format.')
+        return suffix
@@ -0,0 +1,70 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from shop.loadgen import HISTOGRAM_BOUNDS_MS, PERCENTILES, LoadTest
+
+
+class Command(BaseCommand):
+    help = ('Run closed-loop browse, search, detail, cart, checkout and review journeys with concurrent asyncio '
+            'clients against a running server, and report throughput, latency and errors per step.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Server to load, plain HTTP.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Concurrent virtual users.')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run after the ramp-up.')
+        parser.add_argument('--ramp-up', type=float, default=5, help='Seconds over which virtual users start.')
+        parser.add_argument('--think-time', type=float, default=0, help='Mean pause between journeys, in seconds.')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout, in seconds.')
+        parser.add_argument('--username-prefix', default='perf_user_',
+                            help='Virtual users log in as the users whose username starts with this.')
+        parser.add_argument('--password', default='perfdata', help='Password shared by those users.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--histogram', action='store_true', help='Print a latency histogram per step.')
+        parser.add_argument('--json', dest='json_path', help='Also write the summary to this file.')
+
+    def handle(self, *args, **options):
+        usernames = list(
+            CustomUser.objects.filter(username__startswith=options['username_prefix'])
+            .order_by('id').values_list('username', flat=True)[:options['concurrency']]
+        )
+        if not usernames:
+            raise CommandError('No users to log in as; run seed_perf_data first.')
+
+        self.stdout.write(f"{options['concurrency']} virtual users against {options['base_url']} "
+                          f"for {options['duration']}s after a {options['ramp_up']}s ramp-up.")
+        load_test = LoadTest(
+            options['base_url'], usernames, options['password'], concurrency=options['concurrency'],
+            duration=options['duration'], ramp_up=options['ramp_up'], think_time=options['think_time'],
+            timeout=options['timeout'], seed=options['seed'],
+        ).run()
+        summary = load_test.summary()
+        self.report(summary, options['histogram'])
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as stream:
+                json.dump(summary, stream, indent=2)
+
+    def report(self, summary, histogram):
+        columns = ''.join(f'{f"p{percent}":>9}' for percent in PERCENTILES)
+        self.stdout.write(f'{"step":<13}{"requests":>9}{"req/s":>9}{"errors":>8}{"locked":>8}{columns}{"max":>9}')
+        for name, step in summary['steps'].items():
+            latencies = ''.join(f'{_ms(step[f"p{percent}_ms"]):>9}' for percent in PERCENTILES)
+            self.stdout.write(
+                f'{name:<13}{step["requests"]:>9}{step["rps"]:>9.1f}{step["error_rate"]:>8.1%}'
+                f'{step["errors"].get("locked", 0):>8}{latencies}{_ms(step["max_ms"]):>9}')
+            other_errors = {kind: count for kind, count in step['errors'].items() if kind != 'locked'}
+            if other_errors:
+                self.stdout.write(f'{"":<13}errors: ' + ', '.join(f'{kind} {count}' for kind, count in
+                                                                 sorted(other_errors.items())))
+            if histogram:
+                self.stdout.write(f'{"":<13}ms: ' + '  '.join(
+                    f'<{bound}: {count}' if bound else f'>={HISTOGRAM_BOUNDS_MS[-1]}: {count}'
+                    for bound, count in step['histogram']))
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['requests']} requests ({summary['rps']} req/s) and {summary['journeys']} journeys "
+            f"({summary['journeys_per_s']}/s) in {summary['elapsed_s']}s."))
+
+
+def _ms(value):
+    return '-' if value is None else f'{value:.1f}'
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import search
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the full-text search index of the boardgame catalog in a single transaction. Searches keep '
+            'using the old index meanwhile, but it holds the write lock, so all other writes wait until it ends.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Number of boardgame ids per INSERT ... SELECT statement.')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stderr.write('Full-text search requires the SQLite database backend.')
+            return
+        started = time.monotonic()
+        indexed = search.rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} boardgames in {time.monotonic() - started:.2f}s.'))
@@ -0,0 +1,24 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.reporting import rollup_sales
+
+
+class Command(BaseCommand):
+    help = 'Fold orders placed since the last run into the daily sales rollup tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of orders rolled up per transaction.')
+        parser.add_argument('--lag-seconds', type=int, default=60,
+                            help='Leave orders younger than this for the next run.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        batches, last_order_id = rollup_sales(
+            batch_size=options['batch_size'],
+            lag=datetime.timedelta(seconds=options['lag_seconds']),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {batches} batches up to order {last_order_id} in {time.monotonic() - started:.2f}s.'))
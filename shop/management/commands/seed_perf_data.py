@@ -0,0 +1,54 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from shop.seeding import PerfDataSeeder
+
+
+class Command(BaseCommand):
+    help = 'Generate production-scale synthetic catalog, users, reviews, carts and orders for performance testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed produces the same data.')
+        parser.add_argument('--publishers', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=1000)
+        parser.add_argument('--boardgames', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--reviews', type=int, default=1000000)
+        parser.add_argument('--orders', type=int, default=500000)
+        parser.add_argument('--cart-ratio', type=float, default=0.3, help='Share of users with a non-empty cart.')
+        parser.add_argument('--days', type=int, default=730, help='Span of review and order dates.')
+        parser.add_argument('--end-date', help='Last day of the generated history (YYYY-MM-DD), today by default. '
+                                               'Fix it to compare runs made on different days.')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per executemany call.')
+
+    def handle(self, *args, **options):
+        end = None
+        if options['end_date']:
+            day = parse_date(options['end_date'])
+            if day is None:
+                raise CommandError('--end-date must be YYYY-MM-DD.')
+            end = datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.timezone.utc)
+        if options['users'] < 1 or options['boardgames'] < 1 or options['publishers'] < 1 \
+                or options['categories'] < 1:
+            raise CommandError('Publishers, categories, boardgames and users must be positive.')
+
+        seeder = PerfDataSeeder(
+            seed=options['seed'], publishers=options['publishers'], categories=options['categories'],
+            boardgames=options['boardgames'], users=options['users'], reviews=options['reviews'],
+            orders=options['orders'], cart_ratio=options['cart_ratio'], days=options['days'], end=end,
+            batch_size=options['batch_size'],
+        )
+        started = time.monotonic()
+        step_started = started
+
+        def progress(name, count):
+            nonlocal step_started
+            now = time.monotonic()
+            self.stdout.write(f'{count} {name} in {now - step_started:.2f}s')
+            step_started = now
+
+        seeder.run(progress)
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.monotonic() - started:.2f}s.'))
@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import replication
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary database into the read replica, once or every --interval seconds.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep syncing, waiting this many seconds between copies.')
+
+    def handle(self, *args, **options):
+        if replication.replica_alias() not in settings.DATABASES:
+            raise CommandError(f'No {replication.replica_alias()!r} database is configured.')
+        while True:
+            duration = replication.sync_replica()
+            self.stdout.write(f'Synced the replica in {duration:.2f}s.')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
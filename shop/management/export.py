@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from shop.exporting import CONTENT_TYPES, EXPORTS
+
+
+class ExportCommand(BaseCommand):
+    export = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--output', help='Output file, stdout by default.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Number of rows fetched per query.')
+
+    def handle(self, *args, **options):
+        chunks = EXPORTS[self.export](options['format'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
+        else:
+            self.stdout.ending = ''
+            for chunk in chunks:
+                self.stdout.write(chunk)
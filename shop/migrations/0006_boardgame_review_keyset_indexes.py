@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_order_orderboardgame_order_boardgame'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='boardgame',
+            index=models.Index(fields=['name', 'id'], name='boardgame_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['boardgame', '-created', '-id'], name='review_bg_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:06
+
+import django.db.models.deletion
+import shop.fields
+from django.db import migrations, models
+
+
+CREATE_SEARCH_TABLE = '''
+    CREATE VIRTUAL TABLE shop_boardgame_search USING fts5(
+        name, description, publisher, categories,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+'''
+
+CONFIGURE_RANK = '''
+    INSERT INTO shop_boardgame_search(shop_boardgame_search, rank) VALUES ('rank', 'bm25(10.0, 1.0, 2.0, 3.0)')
+'''
+
+POPULATE_SEARCH_TABLE = '''
+    INSERT INTO shop_boardgame_search(rowid, name, description, publisher, categories)
+    SELECT b.id, b.name, b.description, p.name,
+           COALESCE((SELECT group_concat(c.name, ' ')
+                     FROM shop_boardgame_categories bc
+                     INNER JOIN shop_category c ON c.id = bc.category_id
+                     WHERE bc.boardgame_id = b.id), '')
+    FROM shop_boardgame b
+    INNER JOIN shop_publisher p ON p.id = b.publisher_id
+'''
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(CONFIGURE_RANK)
+    schema_editor.execute(POPULATE_SEARCH_TABLE)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS shop_boardgame_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_boardgame_review_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardgameSearchEntry',
+            fields=[
+                ('boardgame', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='shop.boardgame')),
+                ('document', shop.fields.SearchDocumentField(db_column='shop_boardgame_search')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'shop_boardgame_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
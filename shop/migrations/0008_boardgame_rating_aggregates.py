@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:10
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_ratings(apps, schema_editor):
+    Boardgame = apps.get_model('shop', 'Boardgame')
+    Review = apps.get_model('shop', 'Review')
+
+    def aggregate(expression):
+        reviews = Review.objects.filter(boardgame=OuterRef('pk')).order_by().values('boardgame')
+        return Subquery(reviews.annotate(value=expression).values('value'))
+
+    Boardgame.objects.update(
+        rating_sum=Coalesce(aggregate(Sum('rating')), 0),
+        rating_count=Coalesce(aggregate(Count('id')), 0),
+        rating_avg=Cast(aggregate(Sum('rating')), FloatField()) / aggregate(Count('id')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_boardgame_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='boardgame',
+            name='rating_avg',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Rating'),
+        ),
+        migrations.AddField(
+            model_name='boardgame',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='boardgame',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
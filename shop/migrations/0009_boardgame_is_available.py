@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_boardgame_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='boardgame',
+            name='is_available',
+            field=models.BooleanField(default=True, verbose_name='Available'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:13
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    CartBoardgame = apps.get_model('shop', 'CartBoardgame')
+    duplicates = (
+        CartBoardgame.objects.values('cart', 'boardgame')
+        .annotate(lines=Count('id'), keep=Min('id'), quantity=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for duplicate in duplicates:
+        lines = CartBoardgame.objects.filter(cart=duplicate['cart'], boardgame=duplicate['boardgame'])
+        lines.exclude(id=duplicate['keep']).delete()
+        lines.update(quantity=duplicate['quantity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_boardgame_is_available'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartboardgame',
+            constraint=models.UniqueConstraint(fields=('cart', 'boardgame'), name='unique_cart_boardgame'),
+        ),
+    ]
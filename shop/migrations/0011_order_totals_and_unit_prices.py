@@ -0,0 +1,48 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:16
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    OrderBoardgame = apps.get_model('shop', 'OrderBoardgame')
+    Boardgame = apps.get_model('shop', 'Boardgame')
+
+    OrderBoardgame.objects.filter(unit_price__isnull=True).update(
+        unit_price=Subquery(Boardgame.objects.filter(pk=OuterRef('boardgame_id')).values('price')[:1])
+    )
+    line_totals = (
+        OrderBoardgame.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        .annotate(total=Sum(ExpressionWrapper(F('quantity') * F('unit_price'),
+                                              output_field=DecimalField(max_digits=12, decimal_places=2))))
+        .values('total')
+    )
+    Order.objects.update(total_amount=Coalesce(Subquery(line_totals), 0, output_field=DecimalField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_cartboardgame_unique_cart_boardgame'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total'),
+        ),
+        migrations.AddField(
+            model_name='orderboardgame',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=7, null=True, verbose_name='Unit Price'),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderboardgame',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=7, verbose_name='Unit Price'),
+        ),
+    ]
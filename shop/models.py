@@ -1,8 +1,12 @@
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import Avg, Sum, F
+from django.db.models import Sum, F
 
 from accounts.models import CustomUser
+from shop.fields import SearchDocumentField
+
+
+RATING_FIELDS = ('rating_sum', 'rating_count', 'rating_avg')
 
 
 class Boardgame(models.Model):
@@ -20,14 +24,31 @@ class Boardgame(models.Model):
         verbose_name='Max. Game Time')
     categories = models.ManyToManyField('Category', verbose_name='Categories')
     publisher = models.ForeignKey('Publisher', on_delete=models.CASCADE, verbose_name='Publisher')
+    is_available = models.BooleanField(default=True, verbose_name='Available')
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(blank=True, null=True, editable=False, verbose_name='Rating')
+    # Also bumped by rating updates, it is the Last-Modified of the boardgame's pages.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='boardgame_name_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Rating aggregates are only ever written through F() updates, so a stale copy must not overwrite them.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in RATING_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def avg_rating(self):
-        avg_rating = self.review_set.aggregate(Avg('rating'))['rating__avg']
-        if avg_rating is not None:
-            return round(avg_rating, 2)
+        if self.rating_count:
+            return round(self.rating_avg, 2)
         return "No Review Added"
 
     def __str__(self):
@@ -55,6 +76,21 @@ class Publisher(models.Model):
         return self.name
 
 
+class BoardgameSearchEntry(models.Model):
+    boardgame = models.OneToOneField(
+        Boardgame,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_entry')
+    document = SearchDocumentField(db_column='shop_boardgame_search')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'shop_boardgame_search'
+
+
 RATING = (
     (1, '1 star'),
     (2, '2 star'),
@@ -68,12 +104,25 @@ class Review(models.Model):
     rating = models.IntegerField(choices=RATING, default=0)
     comment = models.TextField(blank=True, null=True)
     created = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     boardgame = models.ForeignKey(Boardgame, on_delete=models.CASCADE)
 
     class Meta:
         ordering = ['-created']
         unique_together = ('user', 'boardgame')
+        indexes = [
+            models.Index(fields=['boardgame', '-created', '-id'], name='review_bg_created_id_idx'),
+            models.Index(fields=['boardgame', 'updated_at'], name='review_bg_updated_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        if 'rating' in loaded and 'boardgame_id' in loaded:
+            instance._loaded_rating = (loaded['boardgame_id'], loaded['rating'])
+        return instance
 
     def __str__(self):
         return f'{self.boardgame} - {self.rating}'
@@ -84,6 +133,11 @@ class CartBoardgame(models.Model):
     cart = models.ForeignKey('Cart', on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'boardgame'], name='unique_cart_boardgame'),
+        ]
+
     def total(self):
         return self.quantity * self.boardgame.price
 
@@ -103,18 +157,87 @@ class OrderBoardgame(models.Model):
     boardgame = models.ForeignKey(Boardgame, on_delete=models.CASCADE)
     order = models.ForeignKey('Order', on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=7, decimal_places=2, verbose_name='Unit Price')
 
     def total(self):
-        return self.quantity * self.boardgame.price
+        return self.quantity * self.unit_price
 
 
 class Order(models.Model):
     boardgame = models.ManyToManyField(Boardgame, through='OrderBoardgame')
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     date_ordered = models.DateTimeField(auto_now_add=True)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Total')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-date_ordered', '-id'], name='order_user_date_id_idx'),
+        ]
 
     def total(self):
-        result = self.orderboardgame_set.aggregate(
-            total=Sum(F('quantity') * F('boardgame__price'))
-        )['total'] or 0
-        return round(result, 2)
+        return round(self.total_amount, 2)
+
+
+class SalesRollupState(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    last_order_id = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} @ {self.last_order_id}'
+
+
+class SalesRollup(models.Model):
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        ordering = ['day']
+
+
+class DailySales(SalesRollup):
+    class Meta(SalesRollup.Meta):
+        verbose_name_plural = 'Daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='unique_daily_sales'),
+        ]
+
+
+class DailyBoardgameSales(SalesRollup):
+    boardgame = models.ForeignKey(Boardgame, on_delete=models.CASCADE)
+
+    class Meta(SalesRollup.Meta):
+        verbose_name_plural = 'Daily boardgame sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'boardgame'], name='unique_daily_boardgame_sales'),
+        ]
+
+
+class DailyPublisherSales(SalesRollup):
+    publisher = models.ForeignKey(Publisher, on_delete=models.CASCADE)
+
+    class Meta(SalesRollup.Meta):
+        verbose_name_plural = 'Daily publisher sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'publisher'], name='unique_daily_publisher_sales'),
+        ]
+
+
+class DailyCategorySales(SalesRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+
+    class Meta(SalesRollup.Meta):
+        verbose_name_plural = 'Daily category sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='unique_daily_category_sales'),
+        ]
+
+
+class ReplicaHeartbeat(models.Model):
+    beat = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.beat}'
@@ -0,0 +1,229 @@
+import copy
+import hashlib
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from shop import conditional, replication
+from shop.holes import fill_holes
+from shop.versioning import bump_versions_on_commit, get_versions
+
+logger = logging.getLogger(__name__)
+
+PAGE_KEY = 'shop:page:{digest}'
+TAG_VERSION_KEY = 'shop:page:tag:{tag}'
+REVALIDATE_LOCK_KEY = 'shop:page:revalidating:{digest}'
+REVALIDATE_TIMEOUT = 30
+# Carried by every cached page, bumping it drops them all.
+ALL_PAGES = 'pages'
+CATALOG = 'catalog'
+LABELS = 'labels'
+BOARDGAME = 'boardgame:{pk}'
+REVIEWS = 'reviews:{pk}'
+
+# The tags of each cached URL name, formatted with the URL's kwargs.
+DEFAULT_PAGES = {
+    'landing_page': [CATALOG],
+    'boardgames_list': [CATALOG],
+    'boardgame_details': [BOARDGAME, LABELS],
+    'reviews_list': ['reviews:{boardgame_pk}'],
+}
+
+DEFAULT_TIMEOUT = 60
+DEFAULT_STALE_TIMEOUT = 5 * 60
+
+HIT = 'HIT'
+STALE = 'STALE'
+MISS = 'MISS'
+
+# Anonymous visitors get whole pages; logged-in users share a shell per variant, holes filled per request.
+ANONYMOUS = 'anonymous'
+USER_SHELL = 'user'
+SUPERUSER_SHELL = 'superuser'
+
+
+def get_options():
+    return getattr(settings, 'SHOP_PAGE_CACHE', {})
+
+
+def is_enabled():
+    return get_options().get('ENABLED', False)
+
+
+def page_tags(url_name, kwargs):
+    """Tags of a cacheable page, or None when pages of this URL are not cached."""
+    tags = get_options().get('PAGES', DEFAULT_PAGES).get(url_name)
+    if tags is None:
+        return None
+    return [ALL_PAGES, *(tag.format(**kwargs) for tag in tags)]
+
+
+def normalized_query(query_dict):
+    # Parameter and value order never changes a page, and neither do empty values.
+    return urlencode(sorted((name, value) for name, values in query_dict.lists() for value in values if value))
+
+
+def page_key(request, variant):
+    query = normalized_query(request.GET)
+    digest = hashlib.sha1(f'{variant}:{request.path}?{query}'.encode()).hexdigest()
+    return digest, PAGE_KEY.format(digest=digest)
+
+
+def tag_versions(tags):
+    keys = {tag: TAG_VERSION_KEY.format(tag=tag) for tag in tags}
+    versions = get_versions(list(keys.values()))
+    return {tag: versions[key] for tag, key in keys.items()}
+
+
+def invalidate(*tags):
+    bump_versions_on_commit(TAG_VERSION_KEY.format(tag=tag) for tag in tags)
+
+
+def invalidate_boardgames(pks):
+    pks = set(pks)
+    if pks:
+        invalidate(CATALOG, *(BOARDGAME.format(pk=pk) for pk in pks), *(REVIEWS.format(pk=pk) for pk in pks))
+
+
+def invalidate_reviews(boardgame_pk):
+    # The details page shows the average rating.
+    invalidate(REVIEWS.format(pk=boardgame_pk), BOARDGAME.format(pk=boardgame_pk))
+
+
+class CachedPage:
+    def __init__(self, response, versions, timeout):
+        self.status = response.status_code
+        self.content = response.content
+        self.headers = list(response.headers.items())
+        self.versions = versions
+        self.fresh_until = time.time() + timeout
+
+    def state(self, versions):
+        if versions != self.versions:
+            return None
+        return HIT if time.time() < self.fresh_until else STALE
+
+    def response(self, state):
+        response = HttpResponse(self.content, status=self.status)
+        for name, value in self.headers:
+            response[name] = value
+        response['X-Page-Cache'] = state
+        return response
+
+
+def page_variant(request):
+    """Which cached copy of a page the request gets, or None when it can't be served from the cache."""
+    # Flash messages are per visitor.
+    if request.method not in ('GET', 'HEAD') or CookieStorage.cookie_name in request.COOKIES:
+        return None
+    if not request.user.is_authenticated:
+        return ANONYMOUS
+    if not get_options().get('SHELLS', True):
+        return None
+    return SUPERUSER_SHELL if request.user.is_superuser else USER_SHELL
+
+
+def is_storable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # A page showing a CSRF token is tied to the visitor's cookie.
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+class PageCacheMiddleware:
+    """Caches whole pages for anonymous visitors and page shells for logged-in users, dropping them when a tag
+    they depend on is invalidated.
+
+    Pages past their timeout are served stale for up to STALE_TIMEOUT while one background request renders
+    them afresh.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        variant = page_variant(request) if is_enabled() else None
+        if variant is None:
+            return self.get_response(request)
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return self.get_response(request)
+        tags = page_tags(match.url_name, match.kwargs)
+        if tags is None:
+            return self.get_response(request)
+
+        request.renders_shell = variant != ANONYMOUS
+        digest, key = page_key(request, variant)
+        versions = tag_versions(tags)
+        page = cache.get(key)
+        state = page.state(versions) if page is not None else None
+        if state == STALE and cache.add(REVALIDATE_LOCK_KEY.format(digest=digest), 1, REVALIDATE_TIMEOUT):
+            threading.Thread(target=self.revalidate, args=(self.clone(request), digest, key, versions),
+                             name='shop-page-revalidate', daemon=True).start()
+        if state is not None:
+            response = self.validate(request, match, page.response(state))
+            if response.status_code == 304:
+                response['X-Page-Cache'] = state
+                return response
+        else:
+            response = self.render(request, key, versions)
+            response['X-Page-Cache'] = MISS
+        if request.renders_shell and not response.streaming:
+            response.content = fill_holes(response.content, request)
+        return response
+
+    @staticmethod
+    def validate(request, match, response):
+        """The cached response, or 304 Not Modified when the visitor already has it."""
+        validators = getattr(getattr(match.func, 'view_class', None), 'validators', None)
+        if request.renders_shell and validators is not None:
+            # A shell's stored validators are those of whoever rendered it.
+            del response['ETag']
+            del response['Last-Modified']
+            conditional.set_validators(response, *validators(request, **match.kwargs))
+        return get_conditional_response(request, etag=response.get('ETag'),
+                                        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+                                        response=response)
+
+    def render(self, request, key, versions):
+        # Versions are read before rendering, so an invalidation during the render makes the page stale at once.
+        response = self.get_response(request)
+        if is_storable(request, response):
+            options = get_options()
+            timeout = options.get('TIMEOUT', DEFAULT_TIMEOUT)
+            if getattr(request, 'reads_replica', False):
+                timeout = min(timeout, replication.get_options().get('MAX_LAG', 30))
+            page = CachedPage(response, versions, timeout)
+            cache.set(key, page, timeout + options.get('STALE_TIMEOUT', DEFAULT_STALE_TIMEOUT))
+        return response
+
+    def revalidate(self, request, digest, key, versions):
+        try:
+            self.render(request, key, versions)
+        except Exception:
+            logger.exception('Revalidating %s failed.', request.path)
+        finally:
+            cache.delete(REVALIDATE_LOCK_KEY.format(digest=digest))
+            connections.close_all()
+
+    @staticmethod
+    def clone(request):
+        # The stale response goes back on this request, so the background render gets its own copy.
+        clone = copy.copy(request)
+        clone.META = request.META.copy()
+        return clone
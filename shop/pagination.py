@@ -0,0 +1,166 @@
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+NEXT = 'n'
+PREV = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not cursor serializable')
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps({'d': direction, 'k': values}, default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, values = payload['d'], payload['k']
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise InvalidCursor(token)
+    if direction not in (NEXT, PREV) or not isinstance(values, list):
+        raise InvalidCursor(token)
+    return direction, values
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def seek_condition(ordering, values):
+    # name >= x AND (name > x OR (name = x AND id > y)); the redundant leading
+    # bound lets SQLite start an index range scan instead of filtering from the top.
+    first = ordering[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return bound & condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        if cursor:
+            direction, values = decode_cursor(cursor)
+            values = self._to_python(values)
+        else:
+            direction, values = NEXT, None
+
+        ordering = self.ordering if direction == NEXT else tuple(_flip(field) for field in self.ordering)
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(seek_condition(ordering, values))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == PREV:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        if not rows:
+            return KeysetPage(rows)
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(NEXT, self._key(rows[-1])) if has_next else None,
+            previous_cursor=encode_cursor(PREV, self._key(rows[0])) if has_previous else None,
+        )
+
+    def _key(self, obj):
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def _to_python(self, values):
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(values)
+        opts = self.queryset.model._meta
+        result = []
+        for field, value in zip(self.ordering, values):
+            try:
+                result.append(opts.get_field(field.lstrip('-')).to_python(value))
+            except FieldDoesNotExist:
+                result.append(value)
+            except ValidationError:
+                raise InvalidCursor(values)
+        return result
+
+
+class KeysetPaginationMixin:
+    keyset_ordering = None
+    keyset_page_size = 20
+    cursor_kwarg = 'cursor'
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def get_context_object_name(self, object_list):
+        return super().get_context_object_name(self.object_list)
+
+    def get_context_data(self, **kwargs):
+        paginator = KeysetPaginator(self.object_list, self.get_keyset_ordering(), self.keyset_page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context['keyset_page'] = page
+        context['is_paginated'] = page.has_next() or page.has_previous()
+        context['next_page_url'] = self._cursor_url(page.next_cursor)
+        context['previous_page_url'] = self._cursor_url(page.previous_cursor)
+        return context
+
+    def _cursor_url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params[self.cursor_kwarg] = cursor
+        return f'?{params.urlencode()}'
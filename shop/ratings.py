@@ -0,0 +1,56 @@
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now
+
+from shop.models import Boardgame, Review
+
+
+def apply_rating_change(boardgame_id, sum_delta, count_delta):
+    new_sum = F('rating_sum') + sum_delta
+    new_count = F('rating_count') + count_delta
+    Boardgame.objects.filter(pk=boardgame_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating_avg=Case(
+            When(rating_count=-count_delta, then=Value(None)),
+            default=Cast(new_sum, FloatField()) / new_count,
+            output_field=FloatField(),
+        ),
+        updated_at=Now(),
+    )
+
+
+def _review_aggregate(expression):
+    reviews = Review.objects.filter(boardgame=OuterRef('pk')).order_by().values('boardgame')
+    return Subquery(reviews.annotate(value=expression).values('value'))
+
+
+def recompute_ratings(queryset):
+    rating_sum = Coalesce(_review_aggregate(Sum('rating')), 0)
+    rating_count = Coalesce(_review_aggregate(Count('id')), 0)
+    return queryset.update(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        rating_avg=Cast(_review_aggregate(Sum('rating')), FloatField()) / _review_aggregate(Count('id')),
+        updated_at=Now(),
+    )
+
+
+def review_saved(review, created):
+    loaded = getattr(review, '_loaded_rating', None)
+    if created:
+        apply_rating_change(review.boardgame_id, review.rating, 1)
+    elif loaded is None:
+        recompute_ratings(Boardgame.objects.filter(pk=review.boardgame_id))
+    else:
+        old_boardgame_id, old_rating = loaded
+        if old_boardgame_id != review.boardgame_id:
+            apply_rating_change(old_boardgame_id, -old_rating, -1)
+            apply_rating_change(review.boardgame_id, review.rating, 1)
+        elif old_rating != review.rating:
+            apply_rating_change(review.boardgame_id, review.rating - old_rating, 0)
+    review._loaded_rating = (review.boardgame_id, review.rating)
+
+
+def review_deleted(review):
+    boardgame_id, rating = getattr(review, '_loaded_rating', (review.boardgame_id, review.rating))
+    apply_rating_change(boardgame_id, -rating, -1)
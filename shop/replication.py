@@ -0,0 +1,172 @@
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from shop.models import ReplicaHeartbeat
+
+logger = logging.getLogger(__name__)
+
+# Models the catalog pages read; everything else, sessions and users included, always reads the primary.
+CATALOG_MODELS = {
+    'shop.boardgame', 'shop.boardgame_categories', 'shop.boardgamesearchentry', 'shop.category', 'shop.publisher',
+    'shop.review',
+}
+LAST_WRITE_SESSION_KEY = '_db_last_write'
+LAG_CHECK_INTERVAL = 1.0
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_reading_replica = ContextVar('reading_replica', default=False)
+_request_wrote = ContextVar('request_wrote', default=False)
+_heartbeat = None
+_heartbeat_lock = threading.Lock()
+
+
+def get_options():
+    return getattr(settings, 'SHOP_READ_REPLICA', {})
+
+
+def is_enabled():
+    options = get_options()
+    return options.get('ENABLED', False) and options.get('ALIAS', 'replica') in settings.DATABASES
+
+
+def replica_alias():
+    return get_options().get('ALIAS', 'replica')
+
+
+@contextmanager
+def reading_replica(enabled=True):
+    token = _reading_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _reading_replica.reset(token)
+
+
+def primary():
+    return reading_replica(False)
+
+
+def is_reading_replica():
+    return _reading_replica.get()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reading_replica.get() and model._meta.label_lower in CATALOG_MODELS:
+            return replica_alias()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, replica_alias()}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a page-for-page copy of the primary, its schema arrives with the data.
+        return db != replica_alias()
+
+
+def sync_replica():
+    """Copy the primary into the replica with SQLite's online backup API, stamping a heartbeat first."""
+    started = time.monotonic()
+    ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS).update_or_create(pk=1, defaults={'beat': timezone.now()})
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    target = sqlite3.connect(connections[replica_alias()].settings_dict['NAME'], timeout=30)
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
+    reset()
+    return time.monotonic() - started
+
+
+def replica_heartbeat():
+    """When the replica's copy was taken, re-read at most once a second per process."""
+    global _heartbeat
+    heartbeat = _heartbeat
+    if heartbeat is None or time.monotonic() - heartbeat[0] > LAG_CHECK_INTERVAL:
+        with _heartbeat_lock:
+            try:
+                beat = ReplicaHeartbeat.objects.using(replica_alias()).values_list('beat', flat=True).first()
+            except Exception:
+                logger.exception('Cannot read the replica heartbeat.')
+                beat = None
+            heartbeat = _heartbeat = (time.monotonic(), beat)
+    return heartbeat[1]
+
+
+def replica_lag():
+    beat = replica_heartbeat()
+    return None if beat is None else (timezone.now() - beat).total_seconds()
+
+
+def reset():
+    global _heartbeat
+    _heartbeat = None
+
+
+def mark_write():
+    """Record a write made for this request on another connection, such as the write queue's."""
+    _request_wrote.set(True)
+
+
+class ReplicaRoutingMiddleware:
+    """Serves replica_reads views from the replica, unless the session wrote something the replica lacks."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.reads_replica = False
+        if not is_enabled():
+            return self.get_response(request)
+        wrote_token = _request_wrote.set(False)
+
+        def detect_writes(execute, sql, params, many, context):
+            if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS) and 'django_session' not in sql:
+                _request_wrote.set(True)
+            return execute(sql, params, many, context)
+
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(detect_writes):
+                response = self.get_response(request)
+            wrote = _request_wrote.get()
+        finally:
+            _request_wrote.reset(wrote_token)
+            if request.reads_replica:
+                _reading_replica.reset(request.reads_replica)
+        if wrote and hasattr(request, 'session'):
+            request.session[LAST_WRITE_SESSION_KEY] = time.time()
+        if request.reads_replica and settings.DEBUG:
+            response['X-DB-Replica-Lag'] = f'{replica_lag():.3f}'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if getattr(view_class, 'replica_reads', False) and self.can_read_replica(request):
+            # Reset in __call__, after lazy querysets in the template have been rendered.
+            request.reads_replica = _reading_replica.set(True)
+
+    def can_read_replica(self, request):
+        if not is_enabled() or request.method not in ('GET', 'HEAD'):
+            return False
+        beat = replica_heartbeat()
+        if beat is None:
+            return False
+        lag = (timezone.now() - beat).total_seconds()
+        if lag > get_options().get('MAX_LAG', 30):
+            logger.warning('Replica lag %.1fs is over the limit, reading the primary.', lag)
+            return False
+        last_write = request.session.get(LAST_WRITE_SESSION_KEY) if hasattr(request, 'session') else None
+        # Read your own writes: only once the replica's copy was taken after this session last wrote.
+        return last_write is None or beat.timestamp() >= last_write
@@ -0,0 +1,105 @@
+import datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from shop.models import (DailyBoardgameSales, DailyCategorySales, DailyPublisherSales, DailySales, Order,
+                         OrderBoardgame, SalesRollupState)
+
+STATE_NAME = 'daily_sales'
+CENT = Decimal('0.01')
+LINE_REVENUE = ExpressionWrapper(F('quantity') * F('unit_price'),
+                                 output_field=DecimalField(max_digits=14, decimal_places=2))
+
+# Rollup model, the dimension column it is keyed on, and the order line path that dimension comes from.
+DIMENSIONS = (
+    (DailySales, None, None),
+    (DailyBoardgameSales, 'boardgame_id', 'boardgame_id'),
+    (DailyPublisherSales, 'publisher_id', 'boardgame__publisher_id'),
+    (DailyCategorySales, 'category_id', 'boardgame__categories'),
+)
+
+
+def _increment(model, key_column, rows):
+    table = model._meta.db_table
+    keys = ['day'] + ([key_column] if key_column else [])
+    columns = keys + ['revenue', 'units', 'orders']
+    updates = ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in ('revenue', 'units', 'orders'))
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))}) '
+        f'ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates}'
+    )
+    ops = connection.ops
+    params = [
+        [ops.adapt_datefield_value(row['day'])]
+        + ([row['key']] if key_column else [])
+        + [ops.adapt_decimalfield_value(row['revenue'].quantize(CENT)), row['units'], row['orders']]
+        for row in rows
+    ]
+    if params:
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+
+def _rollup_lines(lines):
+    for model, key_column, path in DIMENSIONS:
+        grouping = {'day': TruncDate('order__date_ordered')}
+        if path:
+            grouping['key'] = F(path)
+        rows = (
+            lines.order_by().values(**grouping)
+            .annotate(revenue=Sum(LINE_REVENUE), units=Sum('quantity'), orders=Count('order_id', distinct=True))
+        )
+        if path:
+            rows = rows.filter(key__isnull=False)
+        _increment(model, key_column, rows)
+
+
+def _next_batch(last_order_id, batch_size, cutoff):
+    orders = Order.objects.filter(id__gt=last_order_id).order_by('id').values_list('id', 'date_ordered')
+    batch = []
+    for order_id, date_ordered in orders[:batch_size]:
+        # Stop at the first order inside the lag window, so a late-committing lower id is not skipped.
+        if date_ordered > cutoff:
+            break
+        batch.append(order_id)
+    return batch[-1] if batch else None
+
+
+def rollup_sales(batch_size=5000, lag=datetime.timedelta(minutes=1)):
+    processed_batches = 0
+    while True:
+        with transaction.atomic():
+            state, _ = SalesRollupState.objects.select_for_update().get_or_create(name=STATE_NAME)
+            high = _next_batch(state.last_order_id, batch_size, timezone.now() - lag)
+            if high is None:
+                return processed_batches, state.last_order_id
+            _rollup_lines(OrderBoardgame.objects.filter(order_id__gt=state.last_order_id, order_id__lte=high))
+            state.last_order_id = high
+            state.save(update_fields=['last_order_id', 'updated'])
+        processed_batches += 1
+
+
+def _top(model, dimension, start, end, limit):
+    return list(
+        model.objects.filter(day__gte=start, day__lte=end)
+        .values(dimension_id=F(f'{dimension}_id'), name=F(f'{dimension}__name'))
+        .annotate(revenue=Sum('revenue'), units=Sum('units'), orders=Sum('orders'))
+        .order_by('-revenue', 'dimension_id')[:limit]
+    )
+
+
+def sales_report(start, end, limit=10):
+    daily = list(DailySales.objects.filter(day__gte=start, day__lte=end).values('day', 'revenue', 'units', 'orders'))
+    return {
+        'daily': daily,
+        'revenue': sum((row['revenue'] for row in daily), Decimal('0.00')),
+        'units': sum(row['units'] for row in daily),
+        'orders': sum(row['orders'] for row in daily),
+        'top_boardgames': _top(DailyBoardgameSales, 'boardgame', start, end, limit),
+        'top_publishers': _top(DailyPublisherSales, 'publisher', start, end, limit),
+        'top_categories': _top(DailyCategorySales, 'category', start, end, limit),
+    }
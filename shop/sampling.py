@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+from array import array
+from itertools import accumulate
+
+from django.core.cache import cache
+
+from shop import replication
+from shop.models import Boardgame
+from shop.versioning import CATALOG_VERSION, get_version
+
+POOL_CACHE_KEY = 'shop:sampling:pool:{version}'
+POOL_TIMEOUT = 60 * 60
+MAX_WEIGHTED_DRAWS = 10
+MAX_TOP_UPS = 3
+
+_pool = None
+_lock = threading.Lock()
+
+
+class SamplingPool:
+    """Ids of available boardgames with cumulative popularity weights, sampled without touching the table."""
+
+    def __init__(self, version, ids, cum_weights):
+        self.version = version
+        self.ids = ids
+        self.cum_weights = cum_weights
+        self.expires = time.time() + POOL_TIMEOUT
+
+    def is_current(self, version):
+        return self.version == version and self.expires > time.time()
+
+    @classmethod
+    def build(cls, version):
+        rows = Boardgame.objects.filter(is_available=True).order_by().values_list('id', 'rating_count')
+        ids = array('q')
+        weights = array('q')
+        for pk, rating_count in rows.iterator(chunk_size=5000):
+            ids.append(pk)
+            weights.append(rating_count + 1)
+        return cls(version, ids, array('q', accumulate(weights)))
+
+    def sample(self, k, weighted=False, rng=random):
+        k = min(k, len(self.ids))
+        if not weighted:
+            return rng.sample(self.ids, k)
+        chosen = {}
+        for _ in range(MAX_WEIGHTED_DRAWS):
+            for pk in rng.choices(self.ids, cum_weights=self.cum_weights, k=k - len(chosen)):
+                chosen.setdefault(pk, None)
+            if len(chosen) == k:
+                return list(chosen)
+        # Heavy weights can starve the tail, so top up uniformly to always return k distinct games.
+        for pk in rng.sample(self.ids, min(len(self.ids), k + len(chosen))):
+            if len(chosen) == k:
+                break
+            chosen.setdefault(pk, None)
+        return list(chosen)
+
+
+def get_pool():
+    global _pool
+    version = get_version(CATALOG_VERSION)
+    pool = _pool
+    if pool is not None and pool.is_current(version):
+        return pool
+    with _lock:
+        if _pool is None or not _pool.is_current(version):
+            key = POOL_CACHE_KEY.format(version=version)
+            _pool = cache.get(key)
+            if _pool is None:
+                with replication.primary():
+                    _pool = SamplingPool.build(version)
+                cache.set(key, _pool, POOL_TIMEOUT)
+        return _pool
+
+
+def reset():
+    global _pool
+    _pool = None
+
+
+def sample_boardgames(k, weighted=False, rng=random):
+    pool = get_pool()
+    boardgames = []
+    tried = set()
+    # Ids deleted or made unavailable since the pool was cached are skipped and replaced with fresh draws.
+    for _ in range(MAX_TOP_UPS + 1):
+        wanted = k - len(boardgames)
+        if wanted <= 0 or len(tried) >= len(pool.ids):
+            break
+        ids = [pk for pk in pool.sample(len(tried) + wanted, weighted=weighted, rng=rng) if pk not in tried][:wanted]
+        tried.update(ids)
+        found = Boardgame.objects.in_bulk(ids)
+        boardgames += [found[pk] for pk in ids if pk in found and found[pk].is_available]
+    return boardgames
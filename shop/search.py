@@ -0,0 +1,82 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Q, Value
+
+SEARCH_TABLE = 'shop_boardgame_search'
+TOKEN_RE = re.compile(r'\w+')
+
+INDEX_SQL = f'''
+    INSERT INTO {SEARCH_TABLE}(rowid, name, description, publisher, categories)
+    SELECT b.id, b.name, b.description, p.name,
+           COALESCE((SELECT group_concat(c.name, ' ')
+                     FROM shop_boardgame_categories bc
+                     INNER JOIN shop_category c ON c.id = bc.category_id
+                     WHERE bc.boardgame_id = b.id), '')
+    FROM shop_boardgame b
+    INNER JOIN shop_publisher p ON p.id = b.publisher_id
+'''
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(query):
+    # Every token becomes a quoted prefix term, so user input can never be parsed as FTS5 syntax.
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(query))
+
+
+def search_boardgames(queryset, query):
+    match = build_match_query(query)
+    if not match:
+        return queryset.none()
+    if not is_available():
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.filter(search_entry__document__match=match).annotate(search_rank=F('search_entry__rank'))
+
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def index_boardgames(pks, chunk_size=500):
+    if not is_available():
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        for chunk in _chunks(pks, chunk_size):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', chunk)
+            cursor.execute(f'{INDEX_SQL} WHERE b.id IN ({placeholders})', chunk)
+
+
+def remove_boardgames(pks, chunk_size=500):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(pks, chunk_size):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', chunk)
+
+
+def rebuild_index(chunk_size=5000):
+    if not is_available():
+        return 0
+    indexed = 0
+    # One transaction, so searches keep reading the old index until the new one is complete.
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute('SELECT MIN(id), MAX(id) FROM shop_boardgame')
+        low, high = cursor.fetchone()
+        if low is None:
+            return 0
+        for start in range(low, high + 1, chunk_size):
+            cursor.execute(f'{INDEX_SQL} WHERE b.id >= %s AND b.id < %s', [start, start + chunk_size])
+            indexed += cursor.rowcount
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return indexed
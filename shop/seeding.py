@@ -0,0 +1,257 @@
+import datetime
+import math
+import random
+from array import array
+from decimal import Decimal
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from accounts.models import CustomUser
+from shop import facets, fragments, pagecache, search
+from shop.models import Boardgame, Cart, CartBoardgame, Category, Order, OrderBoardgame, Publisher, Review
+
+WORDS = (
+    'ancient', 'arcane', 'border', 'castle', 'city', 'clan', 'coast', 'crown', 'desert', 'dragon', 'dungeon',
+    'empire', 'forest', 'fortress', 'frontier', 'galaxy', 'garden', 'harbor', 'island', 'jungle', 'kingdom',
+    'legacy', 'machine', 'market', 'mountain', 'mystery', 'nebula', 'ocean', 'orbit', 'pirate', 'planet',
+    'quest', 'railway', 'realm', 'river', 'ruins', 'saga', 'secret', 'shadow', 'signal', 'station', 'storm',
+    'temple', 'tower', 'trade', 'valley', 'village', 'voyage', 'winter', 'wizard',
+)
+
+
+def _weighted(values, weights):
+    return values, list(accumulate(weights))
+
+
+PLAYER_COUNTS = _weighted((1, 2, 3, 4), (25, 60, 10, 5))
+EXTRA_PLAYERS = _weighted((0, 1, 2, 3, 4, 5, 6), (5, 20, 30, 25, 10, 6, 4))
+GAME_TIMES = _weighted((15, 20, 30, 45, 60, 90, 120, 180, 240), (6, 8, 18, 18, 20, 12, 10, 5, 3))
+PLAYER_AGES = _weighted((3, 6, 8, 10, 12, 14, 16, 18), (4, 8, 18, 25, 25, 12, 5, 3))
+ORDER_LINES = _weighted((1, 2, 3, 4, 5), (55, 25, 12, 5, 3))
+QUANTITIES = _weighted((1, 2, 3), (85, 10, 5))
+CART_LINES = _weighted((1, 2, 3, 4), (50, 30, 15, 5))
+
+
+def _zipf_cum_weights(n, exponent):
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def _pick(rng, choices):
+    values, cum_weights = choices
+    return rng.choices(values, cum_weights=cum_weights)[0]
+
+
+def _distinct(rng, population, cum_weights, k):
+    k = min(k, len(population))
+    chosen = dict.fromkeys(rng.choices(population, cum_weights=cum_weights, k=k))
+    while len(chosen) < k:
+        chosen.setdefault(rng.choices(population, cum_weights=cum_weights)[0])
+    return list(chosen)
+
+
+def _next_id(model):
+    return (model.objects.aggregate(value=Max('id'))['value'] or 0) + 1
+
+
+class PerfDataSeeder:
+    """Deterministic, production-shaped volumes written through raw executemany inserts."""
+
+    def __init__(self, seed=0, publishers=2000, categories=1000, boardgames=100000, users=100000,
+                 reviews=1000000, orders=500000, cart_ratio=0.3, days=730, end=None, batch_size=10000):
+        self.rng = random.Random(seed)
+        self.counts = {'publishers': publishers, 'categories': categories, 'boardgames': boardgames,
+                       'users': users, 'reviews': reviews, 'orders': orders}
+        self.cart_ratio = cart_ratio
+        self.end = end or datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0,
+                                                                               microsecond=0)
+        self.start = self.end - datetime.timedelta(days=days)
+        self.batch_size = batch_size
+        self.created = {}
+        self.adapt_datetime = connection.ops.adapt_datetimefield_value
+
+    def run(self, progress=None):
+        steps = (
+            ('publishers', self.seed_publishers),
+            ('categories', self.seed_categories),
+            ('boardgames', self.seed_boardgames),
+            ('users', self.seed_users),
+            ('reviews', self.seed_reviews),
+            ('carts', self.seed_carts),
+            ('orders', self.seed_orders),
+        )
+        for name, step in steps:
+            with transaction.atomic():
+                self.created[name] = step()
+            if progress:
+                progress(name, self.created[name])
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Publisher, Category, Boardgame, CustomUser,
+                                                                      Cart, Order]):
+                cursor.execute(sql)
+        search.rebuild_index()
+        facets.invalidate()
+        fragments.invalidate_all()
+        pagecache.invalidate(pagecache.ALL_PAGES)
+        return self
+
+    def _insert(self, model, columns, rows):
+        table = connection.ops.quote_name(model._meta.db_table)
+        sql = (f'INSERT INTO {table} ({", ".join(connection.ops.quote_name(column) for column in columns)}) '
+               f'VALUES ({", ".join(["%s"] * len(columns))})')
+        inserted = 0
+        with connection.cursor() as cursor:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    return inserted
+                cursor.executemany(sql, batch)
+                inserted += len(batch)
+
+    def _datetime(self, fraction):
+        return self.adapt_datetime(self.start + (self.end - self.start) * fraction)
+
+    def _words(self, count):
+        return ' '.join(self.rng.choices(WORDS, k=count))
+
+    def seed_publishers(self):
+        first = _next_id(Publisher)
+        self.publisher_ids = range(first, first + self.counts['publishers'])
+        self.publisher_weights = _zipf_cum_weights(len(self.publisher_ids), 1.1)
+        return self._insert(Publisher, ('id', 'name'), (
+            (pk, f'{self._words(2).title()} Games {pk}'[:50]) for pk in self.publisher_ids
+        ))
+
+    def seed_categories(self):
+        first = _next_id(Category)
+        self.category_ids = range(first, first + self.counts['categories'])
+        self.category_weights = _zipf_cum_weights(len(self.category_ids), 1.0)
+        return self._insert(Category, ('id', 'name'), (
+            (pk, f'{self._words(1).title()} {pk}') for pk in self.category_ids
+        ))
+
+    def seed_boardgames(self):
+        rng = self.rng
+        first = _next_id(Boardgame)
+        self.boardgame_ids = range(first, first + self.counts['boardgames'])
+        # Popularity follows a Zipf curve over a shuffled order, so it does not correlate with the id.
+        self.popular_ids = list(self.boardgame_ids)
+        rng.shuffle(self.popular_ids)
+        self.popularity_weights = _zipf_cum_weights(len(self.popular_ids), 0.9)
+        self.prices = array('q')
+        self.quality = array('d')
+
+        updated_at = self._datetime(1)
+
+        def rows():
+            for pk in self.boardgame_ids:
+                price = min(max(round(rng.lognormvariate(math.log(120), 0.6), 2), 15), 999)
+                self.prices.append(round(price * 100))
+                self.quality.append(rng.gauss(3.7, 0.6))
+                min_players = _pick(rng, PLAYER_COUNTS)
+                min_game_time = _pick(rng, GAME_TIMES)
+                yield (
+                    pk, f'{self._words(rng.randint(1, 3)).title()} {pk}', Decimal(self.prices[-1]).scaleb(-2),
+                    f'{self._words(rng.randint(12, 40)).capitalize()}.', _pick(rng, PLAYER_AGES), min_players,
+                    min_players + _pick(rng, EXTRA_PLAYERS), min_game_time,
+                    min_game_time * rng.choice((1, 2, 3)) if rng.random() < 0.7 else None,
+                    rng.choices(self.publisher_ids, cum_weights=self.publisher_weights)[0],
+                    rng.random() < 0.95, 0, 0, None, updated_at,
+                )
+
+        inserted = self._insert(Boardgame, (
+            'id', 'name', 'price', 'description', 'min_players_age', 'min_players', 'max_players', 'min_game_time',
+            'max_game_time', 'publisher_id', 'is_available', 'rating_sum', 'rating_count', 'rating_avg', 'updated_at',
+        ), rows())
+        self._insert(Boardgame.categories.through, ('boardgame_id', 'category_id'), (
+            (pk, category_id)
+            for pk in self.boardgame_ids
+            for category_id in _distinct(rng, self.category_ids, self.category_weights, rng.randint(1, 4))
+        ))
+        return inserted
+
+    def seed_users(self):
+        first = _next_id(CustomUser)
+        self.user_ids = range(first, first + self.counts['users'])
+        # One hash with a fixed salt for everyone: per-user hashing would dominate the run and break determinism.
+        password = make_password('perfdata', salt='perfdata')
+        return self._insert(CustomUser, (
+            'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name', 'email', 'is_staff',
+            'is_active', 'date_joined',
+        ), (
+            (pk, password, False, f'perf_user_{pk}', '', '', f'perf_user_{pk}@example.com', False, True,
+             self._datetime(self.rng.random()))
+            for pk in self.user_ids
+        ))
+
+    def _user_activity(self, total, exponent):
+        users = list(self.user_ids)
+        self.rng.shuffle(users)
+        return self.rng.choices(users, cum_weights=_zipf_cum_weights(len(users), exponent), k=total)
+
+    def seed_reviews(self):
+        rng = self.rng
+        first = self.boardgame_ids.start
+        per_user = {}
+        for user_id in self._user_activity(self.counts['reviews'], 0.6):
+            per_user[user_id] = per_user.get(user_id, 0) + 1
+        rating_sum = array('q', bytes(8 * len(self.boardgame_ids)))
+        rating_count = array('q', bytes(8 * len(self.boardgame_ids)))
+        comments = [f'{self._words(rng.randint(3, 20)).capitalize()}.' for _ in range(1000)]
+
+        def rows():
+            for user_id in sorted(per_user):
+                for boardgame_id in _distinct(rng, self.popular_ids, self.popularity_weights, per_user[user_id]):
+                    rating = min(max(round(rng.gauss(self.quality[boardgame_id - first], 1)), 1), 5)
+                    rating_sum[boardgame_id - first] += rating
+                    rating_count[boardgame_id - first] += 1
+                    created = self._datetime(rng.random())
+                    yield rating, rng.choice(comments), created, created, user_id, boardgame_id
+
+        inserted = self._insert(Review, ('rating', 'comment', 'created', 'updated_at', 'user_id', 'boardgame_id'),
+                                rows())
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {Boardgame._meta.db_table} SET rating_sum = %s, rating_count = %s, rating_avg = %s '
+                f'WHERE id = %s',
+                [(total, count, total / count, pk)
+                 for pk, total, count in zip(self.boardgame_ids, rating_sum, rating_count) if count],
+            )
+        return inserted
+
+    def seed_carts(self):
+        rng = self.rng
+        first = _next_id(Cart)
+        carts = list(zip(range(first, first + len(self.user_ids)), self.user_ids))
+        self._insert(Cart, ('id', 'user_id'), iter(carts))
+        return self._insert(CartBoardgame, ('cart_id', 'boardgame_id', 'quantity'), (
+            (cart_id, boardgame_id, _pick(rng, QUANTITIES))
+            for cart_id, _ in carts if rng.random() < self.cart_ratio
+            for boardgame_id in _distinct(rng, self.popular_ids, self.popularity_weights, _pick(rng, CART_LINES))
+        ))
+
+    def seed_orders(self):
+        rng = self.rng
+        first = _next_id(Order)
+        first_boardgame = self.boardgame_ids.start
+        # Volume grows over time, and ids follow order dates as they would in production.
+        placed = sorted(math.sqrt(rng.random()) for _ in range(self.counts['orders']))
+        buyers = self._user_activity(len(placed), 0.5)
+        orders = []
+
+        def lines():
+            for offset, user_id in enumerate(buyers):
+                total = 0
+                for boardgame_id in _distinct(rng, self.popular_ids, self.popularity_weights, _pick(rng, ORDER_LINES)):
+                    quantity = _pick(rng, QUANTITIES)
+                    price = self.prices[boardgame_id - first_boardgame]
+                    total += quantity * price
+                    yield first + offset, boardgame_id, quantity, Decimal(price).scaleb(-2)
+                orders.append((first + offset, user_id, self._datetime(placed[offset]), Decimal(total).scaleb(-2)))
+
+        # Lines reference orders inserted at the end of the same transaction; foreign keys are deferred.
+        self._insert(OrderBoardgame, ('order_id', 'boardgame_id', 'quantity', 'unit_price'), lines())
+        return self._insert(Order, ('id', 'user_id', 'date_ordered', 'total_amount'), iter(orders))
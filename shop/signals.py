@@ -0,0 +1,93 @@
+from django.db.models.functions import Now
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from shop import facets, fragments, pagecache, ratings, search
+from shop.models import Boardgame, Category, Publisher, Review
+
+
+def _refresh_boardgames(pks):
+    pks = list(pks)
+    search.index_boardgames(pks)
+    facets.refresh_boardgames(pks)
+    fragments.invalidate_cards(pks)
+    pagecache.invalidate_boardgames(pks)
+
+
+def _categories_changed(pks):
+    pks = list(pks)
+    # Links are saved without the boardgame, and its details page lists them, so its validators must still move.
+    Boardgame.objects.filter(pk__in=pks).update(updated_at=Now())
+    _refresh_boardgames(pks)
+
+
+@receiver(post_save, sender=Boardgame)
+def boardgame_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _refresh_boardgames([instance.pk])
+
+
+@receiver(post_delete, sender=Boardgame)
+def boardgame_deleted(sender, instance, **kwargs):
+    search.remove_boardgames([instance.pk])
+    facets.refresh_boardgames([instance.pk])
+    fragments.invalidate_cards([instance.pk])
+    pagecache.invalidate_boardgames([instance.pk])
+
+
+@receiver(m2m_changed, sender=Boardgame.categories.through)
+def boardgame_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_boardgame_pks = list(instance.boardgame_set.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _categories_changed([instance.pk])
+    elif action == 'post_clear':
+        _categories_changed(getattr(instance, '_cleared_boardgame_pks', []))
+    else:
+        _categories_changed(pk_set)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Publisher)
+def catalog_label_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    facets.invalidate()
+    pagecache.invalidate(pagecache.CATALOG, pagecache.LABELS)
+    if not created:
+        search.index_boardgames(instance.boardgame_set.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    instance._deleted_boardgame_pks = list(instance.boardgame_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    facets.invalidate()
+    pagecache.invalidate(pagecache.CATALOG, pagecache.LABELS)
+    search.index_boardgames(getattr(instance, '_deleted_boardgame_pks', []))
+
+
+@receiver(post_delete, sender=Publisher)
+def publisher_deleted(sender, instance, **kwargs):
+    facets.invalidate()
+    pagecache.invalidate(pagecache.CATALOG, pagecache.LABELS)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    ratings.review_saved(instance, created)
+    pagecache.invalidate_reviews(instance.boardgame_id)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    ratings.review_deleted(instance)
+    pagecache.invalidate_reviews(instance.boardgame_id)
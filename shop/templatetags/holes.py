@@ -0,0 +1,19 @@
+from django import template
+
+from shop.holes import HOLES, placeholder
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **kwargs):
+    """Per-visitor output in a page that may be cached as a shell shared by many users.
+
+    Rendered inline from the template context, or left as a placeholder filled per request when a shell is
+    being rendered. Anything outside a hole must not depend on who is logged in, beyond being a superuser.
+    """
+    request = context.get('request')
+    if getattr(request, 'renders_shell', False):
+        return placeholder(name, kwargs)
+    with context.push(**kwargs):
+        return context.template.engine.get_template(HOLES[name].template).render(context)
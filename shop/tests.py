@@ -1,10 +1,36 @@
+import asyncio
+import csv
+import json
+import multiprocessing
+import pickle
+import sqlite3
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+
 import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
 from django.test import TestCase, Client
 from django.urls import reverse
 from bs4 import BeautifulSoup
 from pytest_django.asserts import assertTemplateUsed
 
-from shop.models import Boardgame, Cart, CartBoardgame, Order, OrderBoardgame, Review
+from BoardgameShop.cache import SQLiteCache
+from accounts.models import CustomUser
+from shop.models import (Boardgame, Category, Publisher, Cart, CartBoardgame, Order, OrderBoardgame, Review,
+                         DailySales, DailyBoardgameSales, DailyPublisherSales, DailyCategorySales, ReplicaHeartbeat)
+from shop import facets, importing, replication, sampling, search
+from shop.benchmarks import SCENARIOS, missing_scenarios
+from shop.instrumentation import QueryRecorder
+from shop.versioning import CATALOG_VERSION, bump_version, get_version
+from shop.loadgen import LoadTest, RequestFailed
+from shop.views import BoardgameDetailView
+from shop.writer import WriteQueue, get_queue, shutdown
+from shop.cart import add_to_cart, remove_from_cart, set_cart_quantity
+from shop.checkout import place_order
 from shop.forms import CustomUserForm
 
 
@@ -17,6 +43,54 @@ def test_landing_page():
     assert response.status_code == 200
 
 
+@pytest.mark.django_db
+def test_landing_page_carousel(publisher, django_assert_max_num_queries):
+    for i in range(10):
+        Boardgame.objects.create(name=f'game {i}', price=10, description='test', min_players_age=3, min_players=1,
+                                 max_players=4, min_game_time=30, publisher=publisher, is_available=i < 5)
+    client = Client()
+    client.get(reverse('landing_page'))
+
+    with django_assert_max_num_queries(1):
+        response = client.get(reverse('landing_page'))
+    carousel = response.context['carousel_boardgames']
+    assert len(carousel) == 3
+    assert len(set(carousel)) == 3
+    assert all(boardgame.is_available for boardgame in carousel)
+
+
+@pytest.mark.django_db
+def test_sample_boardgames_weighted(publisher):
+    popular = Boardgame.objects.create(name='popular', price=10, description='test', min_players_age=3,
+                                       min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+    Boardgame.objects.filter(pk=popular.pk).update(rating_count=10000)
+    Boardgame.objects.create(name='niche', price=10, description='test', min_players_age=3,
+                             min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+    picks = [sampling.sample_boardgames(1, weighted=True)[0] for _ in range(20)]
+    assert picks.count(popular) >= 18
+    assert len(sampling.sample_boardgames(5, weighted=True)) == 2
+
+
+@pytest.mark.django_db
+def test_sample_boardgames_tops_up_stale_pool(publisher):
+    games = [Boardgame.objects.create(name=f'game {i}', price=10, description='test', min_players_age=3,
+                                      min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+             for i in range(6)]
+    sampling.get_pool()
+    # Bulk updates skip the signals, so the cached pool still holds these.
+    Boardgame.objects.filter(pk__in=[game.pk for game in games[:3]]).update(is_available=False)
+    for _ in range(10):
+        picks = sampling.sample_boardgames(3)
+        assert set(picks) == set(games[3:])
+
+
+@pytest.mark.django_db
+def test_catalog_version_never_goes_back(boardgame):
+    bumped = bump_version(CATALOG_VERSION)
+    cache.delete(CATALOG_VERSION)
+    assert get_version(CATALOG_VERSION) > bumped
+
+
 # ------------------------------------------------------------------------------------------------------ boardgame list
 @pytest.mark.django_db
 def test_boardgame_list(boardgame):
@@ -47,7 +121,7 @@ def test_boardgame_list_superuser(superuser, boardgame):
 
 @pytest.mark.django_db
 @pytest.mark.parametrize(
-    'query', ['Test', 'test', 'es', 'TeSt']
+    'query', ['Test', 'test', 'tes', 'TeSt']
 )
 def test_boardgame_list_search(boardgame, query):
     url = reverse('boardgames_list') + f'?q={query}'
@@ -58,6 +132,338 @@ def test_boardgame_list_search(boardgame, query):
     assert response.context["boardgame_list"][0] == boardgame
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'query', ['testPublisher', 'testCategory', 'testCat']
+)
+def test_boardgame_list_search_publisher_and_category(boardgame, query):
+    url = reverse('boardgames_list') + f'?q={query}'
+    response = Client().get(url)
+    assert list(response.context["boardgame_list"]) == [boardgame]
+
+
+@pytest.mark.django_db
+def test_boardgame_list_search_ranking(publisher):
+    in_description = Boardgame.objects.create(name='Ticket to Ride', price=10, description='build a dragon railway',
+                                              min_players_age=3, min_players=1, max_players=4, min_game_time=30,
+                                              publisher=publisher)
+    in_name = Boardgame.objects.create(name='Dragon Castles', price=10, description='tiles', min_players_age=3,
+                                       min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+    url = reverse('boardgames_list') + '?q=dragon'
+    response = Client().get(url)
+    assert list(response.context["boardgame_list"]) == [in_name, in_description]
+
+
+@pytest.mark.django_db
+def test_boardgame_list_search_no_match(boardgame):
+    response = Client().get(reverse('boardgames_list') + '?q=monopoly')
+    assert len(response.context["boardgame_list"]) == 0
+
+
+@pytest.mark.django_db
+def test_search_index_follows_changes(boardgame, category, publisher):
+    url = reverse('boardgames_list')
+    client = Client()
+
+    publisher.name = 'Renamed Publisher'
+    publisher.save()
+    assert list(client.get(url + '?q=renamed').context["boardgame_list"]) == [boardgame]
+
+    boardgame.categories.remove(category)
+    assert len(client.get(url + '?q=testCategory').context["boardgame_list"]) == 0
+
+    boardgame.delete()
+    assert len(client.get(url + '?q=test').context["boardgame_list"]) == 0
+
+
+@pytest.mark.django_db
+def test_rebuild_search_index_command(boardgame):
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM shop_boardgame_search')
+    call_command('rebuild_search_index', stdout=StringIO())
+
+    response = Client().get(reverse('boardgames_list') + '?q=test')
+    assert list(response.context["boardgame_list"]) == [boardgame]
+
+
+@pytest.mark.django_db
+def test_rebuild_search_index_keeps_old_index_on_failure(boardgame, publisher):
+    second = Boardgame.objects.create(name='second', price=10, description='test', min_players_age=3, min_players=1,
+                             max_players=4, min_game_time=30, publisher=publisher)
+    inserts = []
+
+    def fail_second_chunk(execute, sql, params, many, context):
+        if sql.startswith('\n    INSERT INTO shop_boardgame_search'):
+            inserts.append(sql)
+            if len(inserts) == 2:
+                raise RuntimeError('interrupted')
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(fail_second_chunk), pytest.raises(RuntimeError):
+        search.rebuild_index(chunk_size=1)
+
+    response = Client().get(reverse('boardgames_list') + '?q=test')
+    assert set(response.context["boardgame_list"]) == {boardgame, second}
+
+
+def facet_counts(response, name):
+    facet = next(facet for facet in response.context['facets'] if facet['name'] == name)
+    return {value['label']: value['count'] for value in facet['values']}
+
+
+@pytest.mark.django_db
+def test_boardgame_list_facets(boardgame, publisher, category):
+    party = Category.objects.create(name='party')
+    cheap = Boardgame.objects.create(name='cheap', price=20, description='test', min_players_age=8, min_players=4,
+                                     max_players=10, min_game_time=15, publisher=publisher)
+    cheap.categories.add(party, category)
+    client = Client()
+    url = reverse('boardgames_list')
+
+    response = client.get(url)
+    assert response.context['result_count'] == 2
+    assert facet_counts(response, 'category') == {'party': 1, 'testCategory': 2}
+    assert facet_counts(response, 'players') == {'2': 1, '3': 1, '4': 2, '5': 1, '6': 1, '7': 1, '8+': 1}
+    assert facet_counts(response, 'price') == {'Under 50 PLN': 1, '100 - 200 PLN': 1}
+
+    response = client.get(url + f'?category={party.pk}')
+    assert list(response.context['boardgame_list']) == [cheap]
+    assert response.context['result_count'] == 1
+    assert facet_counts(response, 'category') == {'party': 1, 'testCategory': 2}
+    assert facet_counts(response, 'age') == {'8+': 1}
+
+    response = client.get(url + '?players=3&price=under-50&price=100-200')
+    assert list(response.context['boardgame_list']) == [boardgame]
+    assert facet_counts(response, 'price') == {'Under 50 PLN': 0, '100 - 200 PLN': 1}
+
+
+@pytest.mark.django_db
+def test_boardgame_list_facets_top_values(boardgame, publisher, category, monkeypatch):
+    monkeypatch.setattr(facets, 'FACET_LIMIT', 2)
+    party, rare = Category.objects.create(name='party'), Category.objects.create(name='rare')
+    for i, extra in enumerate([[party], [party, rare]]):
+        game = Boardgame.objects.create(name=f'game {i}', price=20, description='test', min_players_age=8,
+                                        min_players=4, max_players=10, min_game_time=15, publisher=publisher)
+        game.categories.add(category, *extra)
+    client = Client()
+    url = reverse('boardgames_list')
+
+    def category_facet(response):
+        return next(facet for facet in response.context['facets'] if facet['name'] == 'category')
+
+    facet = category_facet(client.get(url))
+    assert [value['label'] for value in facet['values']] == ['party', 'testCategory']
+    assert facet['hidden'] == 1
+    assert b'1 more' in client.get(url).content
+
+    facet = category_facet(client.get(url + facet['more_url']))
+    assert [value['label'] for value in facet['values']] == ['party', 'rare', 'testCategory']
+    assert facet['hidden'] == 0
+    assert 'more' not in facet['values'][1]['url']
+
+    facet = category_facet(client.get(url + f'?category={rare.pk}'))
+    assert [value['label'] for value in facet['values']] == ['party', 'rare', 'testCategory']
+
+
+@pytest.mark.django_db
+def test_boardgame_list_facets_follow_changes(boardgame, publisher, django_capture_on_commit_callbacks):
+    client = Client()
+    url = reverse('boardgames_list')
+    assert facet_counts(client.get(url), 'publisher') == {'testPublisher': 1}
+
+    other = Publisher.objects.create(name='otherPublisher')
+    with django_capture_on_commit_callbacks(execute=True):
+        boardgame.publisher = other
+        boardgame.save()
+    assert facet_counts(client.get(url), 'publisher') == {'otherPublisher': 1}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        boardgame.delete()
+    response = client.get(url)
+    assert response.context['result_count'] == 0
+    assert facet_counts(response, 'publisher') == {}
+
+
+@pytest.mark.django_db
+def test_facet_index_patched_on_a_copy(boardgame, django_capture_on_commit_callbacks):
+    index = facets.get_index()
+    universe, publishers = index.universe, dict(index.bitsets['publisher'])
+    with django_capture_on_commit_callbacks(execute=True):
+        boardgame.price = 20
+        boardgame.save()
+
+    patched = facets.get_index()
+    assert patched is not index
+    assert (index.universe, dict(index.bitsets['publisher'])) == (universe, publishers)
+    assert patched.evaluate({})[1]['price'] == {'under-50': 1}
+    # Known labels are kept rather than read again.
+    assert patched.labels is index.labels
+
+
+@pytest.mark.django_db
+def test_boardgame_list_card_cache(boardgame, category, superuser, django_capture_on_commit_callbacks):
+    client = Client()
+    url = reverse('boardgames_list')
+
+    def rendered_cards(response):
+        return [template.name for template in response.templates].count('shop/boardgame_card.html')
+
+    assert rendered_cards(client.get(url)) == 1
+    response = client.get(url)
+    assert rendered_cards(response) == 0
+    assert b'100.00 PLN' in response.content
+    assert b'>Edit<' not in response.content
+
+    with django_capture_on_commit_callbacks(execute=True):
+        boardgame.price = 120
+        boardgame.save()
+    response = client.get(url)
+    assert rendered_cards(response) == 1
+    assert b'120.00 PLN' in response.content
+
+    with django_capture_on_commit_callbacks(execute=True):
+        boardgame.categories.remove(category)
+    assert rendered_cards(client.get(url)) == 1
+    assert rendered_cards(client.get(url)) == 0
+
+    # Superusers get their own variant of the card, with the edit and delete buttons.
+    client.force_login(superuser)
+    response = client.get(url)
+    assert rendered_cards(response) == 1
+    assert b'>Edit<' in response.content
+    assert rendered_cards(client.get(url)) == 0
+
+
+@pytest.mark.django_db
+def test_boardgame_list_keyset_pagination(publisher):
+    for i in range(45):
+        Boardgame.objects.create(name=f'game {i:02d}', price=10, description='test', min_players_age=3,
+                                 min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+    client = Client()
+    url = reverse('boardgames_list')
+
+    response = client.get(url)
+    first_page = [boardgame.name for boardgame in response.context['boardgame_list']]
+    assert first_page == [f'game {i:02d}' for i in range(20)]
+    assert response.context['previous_page_url'] is None
+
+    response = client.get(url + response.context['next_page_url'])
+    assert [boardgame.name for boardgame in response.context['boardgame_list']] == [f'game {i:02d}' for i in range(20, 40)]
+
+    response = client.get(url + response.context['next_page_url'])
+    assert [boardgame.name for boardgame in response.context['boardgame_list']] == [f'game {i:02d}' for i in range(40, 45)]
+    assert response.context['next_page_url'] is None
+
+    response = client.get(url + response.context['previous_page_url'])
+    assert [boardgame.name for boardgame in response.context['boardgame_list']] == [f'game {i:02d}' for i in range(20, 40)]
+
+    response = client.get(url + response.context['previous_page_url'])
+    assert [boardgame.name for boardgame in response.context['boardgame_list']] == first_page
+    assert response.context['previous_page_url'] is None
+
+
+@pytest.mark.django_db
+def test_boardgame_list_keyset_pagination_same_name(publisher):
+    for _ in range(25):
+        Boardgame.objects.create(name='same', price=10, description='test', min_players_age=3,
+                                 min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+    client = Client()
+    url = reverse('boardgames_list')
+    response = client.get(url)
+    first_page = list(response.context['boardgame_list'])
+    response = client.get(url + response.context['next_page_url'])
+    second_page = list(response.context['boardgame_list'])
+
+    assert len(first_page) == 20
+    assert len(second_page) == 5
+    assert not set(first_page) & set(second_page)
+
+
+@pytest.mark.django_db
+def test_boardgame_list_invalid_cursor(boardgame):
+    client = Client()
+    response = client.get(reverse('boardgames_list') + '?cursor=not-a-cursor')
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_import_boardgames_command(tmp_path, boardgame):
+    csv_file = tmp_path / 'feed.csv'
+    csv_file.write_text(
+        'name,price,description,min_players_age,min_players,max_players,min_game_time,max_game_time,publisher,categories\n'
+        'test,120.50,updated,3,2,4,30,90,testPublisher,testCategory|family\n'
+        'Azul,150,tiles,8,2,4,30,,Plan B,abstract\n'
+        'Broken,abc,oops,8,2,4,30,,Plan B,abstract\n'
+    )
+    stderr = StringIO()
+    call_command('import_boardgames', str(csv_file), '--chunk-size', '2', stdout=StringIO(), stderr=stderr)
+
+    boardgame.refresh_from_db()
+    assert boardgame.price == Decimal('120.50')
+    assert boardgame.description == 'updated'
+    assert sorted(boardgame.categories.values_list('name', flat=True)) == ['family', 'testCategory']
+    azul = Boardgame.objects.get(name='Azul')
+    assert azul.publisher.name == 'Plan B'
+    assert azul.max_game_time is None
+    assert list(azul.categories.values_list('name', flat=True)) == ['abstract']
+    assert not Boardgame.objects.filter(name='Broken').exists()
+    assert 'Row 3 skipped' in stderr.getvalue()
+
+    response = Client().get(reverse('boardgames_list') + '?q=tiles')
+    assert list(response.context['boardgame_list']) == [azul]
+
+
+@pytest.mark.django_db
+def test_import_boardgames_command_jsonl(tmp_path, publisher):
+    jsonl_file = tmp_path / 'feed.jsonl'
+    jsonl_file.write_text(
+        '{"name": "Catan", "price": 99, "description": "trade", "min_players_age": 10, "min_players": 3, '
+        '"max_players": 4, "min_game_time": 60, "publisher": "testPublisher", "categories": ["family"]}\n'
+        '{"name": "Broken", \n'
+        '[1, 2]\n'
+        '{"name": "Azul", "price": 150, "min_players_age": 8, "min_players": 2, "max_players": 4, '
+        '"min_game_time": 30, "publisher": "Plan B"}\n'
+    )
+    stderr = StringIO()
+    call_command('import_boardgames', str(jsonl_file), stdout=StringIO(), stderr=stderr)
+
+    catan = Boardgame.objects.get(name='Catan')
+    assert catan.publisher == publisher
+    assert list(catan.categories.values_list('name', flat=True)) == ['family']
+    assert Boardgame.objects.filter(name='Azul').exists()
+    assert 'Row 2 skipped: invalid JSON' in stderr.getvalue()
+    assert 'Row 3 skipped: row must be an object' in stderr.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_boardgames_skips_rows_out_of_range(publisher):
+    good = {'price': 99, 'description': 'ok', 'min_players_age': 10, 'min_players': 3, 'max_players': 4,
+            'min_game_time': 60, 'publisher': 'testPublisher'}
+    rows = [
+        {**good, 'name': 'Catan'},
+        {**good, 'name': 'Too expensive', 'price': 123456789},
+        {**good, 'name': 'Not a price', 'price': 'NaN'},
+        {**good, 'name': 'No players', 'min_players': -5},
+        {**good, 'name': 'Too young', 'min_players_age': 1},
+        {**good, 'name': 'Azul'},
+    ]
+    feed = StringIO(''.join(json.dumps(row) + '\n' for row in rows))
+    importer = importing.BoardgameImporter(chunk_size=10).run(importing.read_jsonl(feed))
+
+    assert sorted(Boardgame.objects.values_list('name', flat=True)) == ['Azul', 'Catan']
+    assert importer.created == 2
+    assert [line_number for line_number, _ in importer.errors] == [2, 3, 4, 5]
+    assert importer.errors[2][1].startswith('min_players:')
+
+
+@pytest.mark.django_db
+def test_import_boardgames_caps_reported_errors(publisher, monkeypatch):
+    monkeypatch.setattr(importing, 'MAX_REPORTED_ERRORS', 2)
+    importer = importing.BoardgameImporter(chunk_size=2).run(importing.read_jsonl(StringIO('[]\n' * 5)))
+    assert importer.skipped == 5
+    assert importer.errors == [(1, 'row must be an object'), (2, 'row must be an object')]
+
+
 # ---------------------------------------------------------------------------------------------------- boardgame detail
 @pytest.mark.django_db
 def test_boardgame_detail_not_authenticated(boardgame):
@@ -316,6 +722,25 @@ def test_cart_list_anonymous():
     assert response.url.startswith(reverse('login'))
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize('lines', [1, 50])
+def test_cart_list_query_count(user, cart, publisher, lines, django_assert_num_queries):
+    for i in range(lines):
+        boardgame = Boardgame.objects.create(name=f'game {i}', price=10, description='test', min_players_age=3,
+                                             min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+        CartBoardgame.objects.create(cart=cart, boardgame=boardgame, quantity=2)
+    client = Client()
+    client.force_login(user)
+
+    with django_assert_num_queries(4):
+        response = client.get(reverse('cart_list'))
+
+    summary = response.context['cart_summary']
+    assert len(summary.lines) == lines
+    assert summary.total == 20 * lines
+    assert str(summary.lines[0].line_total) == '20.00'
+
+
 # ----------------------------------------------------------------------------------------------- add boardgame to cart
 @pytest.mark.django_db
 def test_add_boardgame_to_cart_authenticated(user, boardgame, cart):
@@ -355,6 +780,48 @@ def test_add_boardgame_to_cart_anonymous(boardgame):
     assert response.url.startswith(reverse('login'))
 
 
+@pytest.mark.django_db
+def test_add_boardgame_to_cart_missing_boardgame(user):
+    client = Client()
+    client.force_login(user)
+    response = client.get(reverse('add_boardgame_to_cart', kwargs={'boardgame_pk': 999}))
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_set_cart_quantity(user, boardgame):
+    set_cart_quantity(user, boardgame.pk, 5)
+    assert CartBoardgame.objects.get(cart__user=user, boardgame=boardgame).quantity == 5
+    set_cart_quantity(user, boardgame.pk, 0)
+    assert not CartBoardgame.objects.filter(cart__user=user).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cart_mutations_concurrent(user, boardgame):
+    def hammer(operation, times):
+        try:
+            for _ in range(times):
+                operation(user, boardgame.pk)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=hammer, args=(add_to_cart, 25)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert CartBoardgame.objects.get(cart__user=user, boardgame=boardgame).quantity == 200
+
+    threads = [threading.Thread(target=hammer, args=(operation, 25))
+               for operation in (add_to_cart, remove_from_cart) * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert CartBoardgame.objects.get(cart__user=user, boardgame=boardgame).quantity == 200
+    assert Cart.objects.filter(user=user).count() == 1
+
+
 # ------------------------------------------------------------------------------------------ delete boardgame from cart
 @pytest.mark.django_db
 def test_delete_boardgame_from_cart_authenticated(user, boardgame, cart):
@@ -423,6 +890,64 @@ def test_make_order_empty_cart(user):
     assert not Order.objects.filter(user=user).exists()
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize('lines', [1, 40])
+def test_make_order_query_count(user, cart, publisher, lines, django_assert_num_queries):
+    for i in range(lines):
+        boardgame = Boardgame.objects.create(name=f'game {i}', price=10, description='test', min_players_age=3,
+                                             min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+        CartBoardgame.objects.create(cart=cart, boardgame=boardgame, quantity=2)
+    client = Client()
+    client.force_login(user)
+
+    with django_assert_num_queries(7):
+        client.post(reverse('make_order'))
+
+    order = Order.objects.get(user=user)
+    assert order.orderboardgame_set.count() == lines
+    assert not CartBoardgame.objects.filter(cart=cart).exists()
+
+
+@pytest.mark.django_db
+def test_make_order_snapshots_prices(user, boardgame, cart):
+    CartBoardgame.objects.create(cart=cart, boardgame=boardgame, quantity=3)
+    client = Client()
+    client.force_login(user)
+    client.post(reverse('make_order'))
+
+    boardgame.price = 150
+    boardgame.save()
+
+    order = Order.objects.get(user=user)
+    order_boardgame = order.orderboardgame_set.get()
+    assert order.total_amount == 300
+    assert order.total() == 300
+    assert order_boardgame.unit_price == 100
+    assert order_boardgame.total() == 300
+
+
+@pytest.mark.django_db(transaction=True)
+def test_make_order_concurrent_submissions(user, boardgame, cart):
+    CartBoardgame.objects.create(cart=cart, boardgame=boardgame, quantity=3)
+    barrier = threading.Barrier(6)
+
+    def submit():
+        try:
+            barrier.wait()
+            place_order(user)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=submit) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    order = Order.objects.get(user=user)
+    assert list(order.orderboardgame_set.values_list('boardgame', 'quantity')) == [(boardgame.pk, 3)]
+
+
 # ---------------------------------------------------------------------------------------------------------- order list
 @pytest.mark.django_db
 def test_orders_list_authenticated(user, order):
@@ -448,6 +973,23 @@ def test_orders_list_unauthenticated():
     assert response.url.startswith(reverse('login'))
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize('orders', [1, 30])
+def test_orders_list_query_count(user, boardgame, orders, django_assert_num_queries):
+    for _ in range(orders):
+        order = Order.objects.create(user=user, total_amount=100)
+        OrderBoardgame.objects.create(order=order, boardgame=boardgame, unit_price=100)
+    Order.objects.create(user=CustomUser.objects.create(username='other'))
+    client = Client()
+    client.force_login(user)
+
+    with django_assert_num_queries(3):
+        response = client.get(reverse('orders_list'))
+
+    assert len(response.context['object_list']) == min(orders, 20)
+    assert all(order.user_id == user.pk for order in response.context['object_list'])
+
+
 # ------------------------------------------------------------------------------------------------------- order details
 @pytest.mark.django_db
 def test_order_detail_authenticated(user, order, order_boardgame):
@@ -473,6 +1015,29 @@ def test_order_detail_unauthenticated(order):
     assert response.url.startswith(reverse('login'))
 
 
+@pytest.mark.django_db
+def test_order_detail_other_user(user, order):
+    client = Client()
+    client.force_login(CustomUser.objects.create(username='other'))
+    response = client.get(reverse('order_detail', kwargs={'pk': order.pk}))
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('lines', [1, 30])
+def test_order_detail_query_count(user, order, publisher, lines, django_assert_num_queries):
+    for i in range(lines):
+        boardgame = Boardgame.objects.create(name=f'game {i}', price=10, description='test', min_players_age=3,
+                                             min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+        OrderBoardgame.objects.create(order=order, boardgame=boardgame, unit_price=10)
+    client = Client()
+    client.force_login(user)
+
+    with django_assert_num_queries(4):
+        response = client.get(reverse('order_detail', kwargs={'pk': order.pk}))
+    assert response.status_code == 200
+
+
 # ---------------------------------------------------------------------------------------------------------- review add
 @pytest.mark.django_db
 def test_review_add_authenticated(user, boardgame):
@@ -593,6 +1158,801 @@ def test_reviews_list_no_reviews(client, boardgame):
     assert response.context['boardgame'] == boardgame
 
 
+@pytest.mark.django_db
+def test_reviews_list_keyset_pagination(boardgame):
+    for i in range(30):
+        reviewer = CustomUser.objects.create(username=f'reviewer{i}')
+        Review.objects.create(user=reviewer, boardgame=boardgame, rating=5)
+    client = Client()
+    url = reverse('reviews_list', kwargs={'boardgame_pk': boardgame.pk})
+
+    response = client.get(url)
+    first_page = list(response.context['object_list'])
+    response = client.get(url + response.context['next_page_url'])
+    second_page = list(response.context['object_list'])
+
+    assert len(first_page) == 20
+    assert len(second_page) == 10
+    assert first_page + second_page == list(Review.objects.filter(boardgame=boardgame).order_by('-created', '-id'))
+    assert response.context['next_page_url'] is None
+
+
+# ----------------------------------------------------------------------------------------------------- review ratings
+@pytest.mark.django_db
+def test_rating_aggregates_follow_review_views(user, boardgame):
+    client = Client()
+    client.force_login(user)
+    client.post(reverse('review_add', kwargs={'boardgame_pk': boardgame.pk}), {'rating': 4, 'comment': 'ok'})
+    boardgame.refresh_from_db()
+    assert (boardgame.rating_sum, boardgame.rating_count, boardgame.avg_rating()) == (4, 1, 4.0)
+
+    other = CustomUser.objects.create(username='other')
+    Review.objects.create(user=other, boardgame=boardgame, rating=1)
+    boardgame.refresh_from_db()
+    assert (boardgame.rating_sum, boardgame.rating_count, boardgame.avg_rating()) == (5, 2, 2.5)
+
+    review = Review.objects.get(user=user)
+    client.post(reverse('review_update', kwargs={'pk': review.pk}), {'rating': 2, 'comment': 'meh'})
+    boardgame.refresh_from_db()
+    assert (boardgame.rating_sum, boardgame.rating_count, boardgame.avg_rating()) == (3, 2, 1.5)
+
+    client.post(reverse('review_delete', kwargs={'pk': review.pk}))
+    boardgame.refresh_from_db()
+    assert (boardgame.rating_sum, boardgame.rating_count, boardgame.avg_rating()) == (1, 1, 1.0)
+
+    other.delete()
+    boardgame.refresh_from_db()
+    assert (boardgame.rating_sum, boardgame.rating_count, boardgame.avg_rating()) == (0, 0, 'No Review Added')
+
+
+@pytest.mark.django_db
+def test_boardgame_save_keeps_rating_aggregates(boardgame, review):
+    stale = Boardgame.objects.get(pk=boardgame.pk)
+    Review.objects.filter(pk=review.pk).delete()
+    stale.name = 'renamed'
+    stale.save()
+    stale.refresh_from_db()
+    assert stale.rating_count == 0
+
+
+@pytest.mark.django_db
+def test_avg_rating_needs_no_queries(boardgame, review, django_assert_num_queries):
+    boardgame = Boardgame.objects.get(pk=boardgame.pk)
+    with django_assert_num_queries(0):
+        assert boardgame.avg_rating() == 5
+
+
+@pytest.mark.django_db
+def test_backfill_ratings_command(boardgame, review):
+    Boardgame.objects.filter(pk=boardgame.pk).update(rating_sum=0, rating_count=0, rating_avg=None)
+    call_command('backfill_ratings', stdout=StringIO())
+    boardgame.refresh_from_db()
+    assert (boardgame.rating_sum, boardgame.rating_count, boardgame.rating_avg) == (5, 1, 5.0)
+
+
+# ------------------------------------------------------------------------------------------------------------- exports
+@pytest.mark.django_db
+def test_export_catalog_superuser(superuser, boardgame):
+    client = Client()
+    client.force_login(superuser)
+    response = client.get(reverse('export_catalog'))
+
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/csv'
+    rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+    assert len(rows) == 1
+    assert rows[0]['name'] == 'test'
+    assert rows[0]['publisher'] == 'testPublisher'
+    assert rows[0]['categories'] == 'testCategory'
+
+
+@pytest.mark.django_db
+def test_export_catalog_not_superuser(user):
+    client = Client()
+    client.force_login(user)
+    response = client.get(reverse('export_catalog'))
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_export_orders_ndjson(superuser, order, order_boardgame):
+    Order.objects.filter(pk=order.pk).update(total_amount=100)
+    client = Client()
+    client.force_login(superuser)
+    response = client.get(reverse('export_orders') + '?format=ndjson')
+
+    assert response['Content-Type'] == 'application/x-ndjson'
+    orders = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    assert len(orders) == 1
+    assert orders[0]['order_total'] == '100.00'
+    assert orders[0]['lines'] == [{'boardgame_id': order_boardgame.boardgame_id, 'boardgame_name': 'test',
+                                   'quantity': 1, 'unit_price': '100.00', 'line_total': '100.00'}]
+
+
+@pytest.mark.django_db
+def test_export_orders_command(order, order_boardgame):
+    stdout = StringIO()
+    call_command('export_orders', stdout=stdout)
+    rows = list(csv.DictReader(StringIO(stdout.getvalue())))
+    assert [(row['order_id'], row['boardgame_name'], row['quantity']) for row in rows] == [(str(order.pk), 'test', '1')]
+
+
+# ------------------------------------------------------------------------------------------------------- sales report
+@pytest.mark.django_db
+def test_rollup_sales_incremental(user, boardgame, category, publisher):
+    other = Boardgame.objects.create(name='other', price=20, description='test', min_players_age=3, min_players=1,
+                                     max_players=4, min_game_time=30, publisher=publisher)
+    order = Order.objects.create(user=user, total_amount=240)
+    OrderBoardgame.objects.create(order=order, boardgame=boardgame, quantity=2, unit_price=100)
+    OrderBoardgame.objects.create(order=order, boardgame=other, quantity=2, unit_price=20)
+    call_command('rollup_sales', '--lag-seconds', '0', stdout=StringIO())
+
+    order = Order.objects.create(user=user, total_amount=100)
+    OrderBoardgame.objects.create(order=order, boardgame=boardgame, quantity=1, unit_price=100)
+    call_command('rollup_sales', '--lag-seconds', '0', stdout=StringIO())
+    call_command('rollup_sales', '--lag-seconds', '0', stdout=StringIO())
+
+    day = DailySales.objects.get()
+    assert (day.revenue, day.units, day.orders) == (340, 5, 2)
+    game = DailyBoardgameSales.objects.get(boardgame=boardgame)
+    assert (game.revenue, game.units, game.orders) == (300, 3, 2)
+    house = DailyPublisherSales.objects.get(publisher=publisher)
+    assert (house.revenue, house.units, house.orders) == (340, 5, 2)
+    genre = DailyCategorySales.objects.get(category=category)
+    assert (genre.revenue, genre.units, genre.orders) == (300, 3, 2)
+
+
+@pytest.mark.django_db
+def test_sales_report_superuser(superuser, user, boardgame, query_budget):
+    order = Order.objects.create(user=user, total_amount=100)
+    OrderBoardgame.objects.create(order=order, boardgame=boardgame, quantity=1, unit_price=100)
+    call_command('rollup_sales', '--lag-seconds', '0', stdout=StringIO())
+    client = Client()
+    client.force_login(superuser)
+
+    response = client.get(reverse('sales_report'))
+    assert response.status_code == 200
+    report = response.context['report']
+    assert (report['revenue'], report['units'], report['orders']) == (100, 1, 1)
+    assert [row['name'] for row in report['top_boardgames']] == ['test']
+
+
+@pytest.mark.django_db
+def test_sales_report_not_superuser(user):
+    client = Client()
+    client.force_login(user)
+    assert client.get(reverse('sales_report')).status_code == 403
+
+
+# ------------------------------------------------------------------------------------------------------ query budgets
+@pytest.mark.django_db
+def test_views_within_query_budget(user, boardgame, review, cart, publisher, query_budget):
+    for i in range(5):
+        other = Boardgame.objects.create(name=f'game {i}', price=10, description='test', min_players_age=3,
+                                         min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+        reviewer = CustomUser.objects.create(username=f'reviewer {i}', email=f'reviewer{i}@op.pl')
+        Review.objects.create(user=reviewer, boardgame=boardgame, rating=3, comment='test')
+        add_to_cart(user, other.pk)
+    order = place_order(user)
+    add_to_cart(user, boardgame.pk)
+    client = Client()
+    client.force_login(user)
+
+    for url in [reverse('landing_page'), reverse('boardgames_list'), reverse('boardgame_details', args=[boardgame.pk]),
+                reverse('cart_list'), reverse('orders_list'), reverse('order_detail', args=[order.pk]),
+                reverse('reviews_list', args=[boardgame.pk]), reverse('review_detail', args=[review.pk])]:
+        assert client.get(url).status_code == 200
+    assert client.post(reverse('make_order')).status_code == 302
+    assert len(query_budget) == 9
+
+
+@pytest.mark.django_db
+def test_query_budget_exceeded(user, settings, caplog):
+    settings.QUERY_BUDGETS = {'profile_view': 1}
+    client = Client()
+    client.force_login(user)
+
+    with caplog.at_level('WARNING', logger='shop.instrumentation'):
+        response = client.get(reverse('profile_view'))
+    assert response.query_stats.over_budget
+    assert 'profile_view' in caplog.text
+
+
+@pytest.mark.django_db
+def test_query_stats_headers(user, boardgame, settings):
+    settings.DEBUG = True
+    client = Client()
+    client.force_login(user)
+
+    response = client.get(reverse('boardgame_details', args=[boardgame.pk]))
+    assert int(response['X-DB-Query-Count']) == response.query_stats.count
+    assert response['X-DB-Query-Budget'] == '7'
+    assert response['X-DB-Duplicate-Queries'] == '0'
+    assert 'X-DB-Time-Ms' in response
+
+    settings.DEBUG = False
+    assert 'X-DB-Query-Count' not in client.get(reverse('boardgames_list'))
+
+
+@pytest.mark.django_db
+def test_query_recorder_duplicates(boardgame):
+    with QueryRecorder() as recorder:
+        for _ in range(3):
+            Boardgame.objects.get(pk=boardgame.pk)
+        Category.objects.count()
+    assert recorder.count == 4
+    assert list(recorder.duplicates.values()) == [3]
+
+
+# ---------------------------------------------------------------------------------------------------------- perf data
+@pytest.mark.django_db
+def test_seed_perf_data():
+    call_command('seed_perf_data', '--seed', '3', '--publishers', '5', '--categories', '4', '--boardgames', '50',
+                 '--users', '20', '--reviews', '200', '--orders', '60', stdout=StringIO())
+
+    assert Boardgame.objects.count() == 50
+    assert CustomUser.objects.count() == 20
+    assert Review.objects.count() == 200
+    assert Order.objects.count() == 60
+    assert Cart.objects.count() == 20
+    for boardgame in Boardgame.objects.filter(rating_count__gt=0):
+        ratings = list(boardgame.review_set.values_list('rating', flat=True))
+        assert (boardgame.rating_sum, boardgame.rating_count) == (sum(ratings), len(ratings))
+    for order in Order.objects.prefetch_related('orderboardgame_set'):
+        assert order.total_amount == sum(line.quantity * line.unit_price for line in order.orderboardgame_set.all())
+    dates = list(Order.objects.order_by('id').values_list('date_ordered', flat=True))
+    assert dates == sorted(dates)
+    assert Boardgame.objects.create(name='extra', price=10, description='test', min_players_age=3, min_players=1,
+                                    max_players=4, min_game_time=30, publisher=Publisher.objects.first()).pk == 51
+
+
+@pytest.mark.django_db
+def test_seed_perf_data_deterministic():
+    def seed():
+        with transaction.atomic():
+            call_command('seed_perf_data', '--seed', '5', '--end-date', '2026-01-31', '--publishers', '3',
+                         '--categories', '3', '--boardgames', '20', '--users', '10', '--reviews', '50',
+                         '--orders', '30', stdout=StringIO())
+            rows = (
+                list(Boardgame.objects.order_by('id').values_list('id', 'name', 'price', 'publisher_id', 'rating_sum')),
+                list(Review.objects.order_by('id').values_list('user_id', 'boardgame_id', 'rating', 'created')),
+                list(OrderBoardgame.objects.order_by('id').values_list('order_id', 'order__date_ordered',
+                                                                       'boardgame_id', 'quantity')),
+            )
+            transaction.set_rollback(True)
+        return rows
+
+    assert seed() == seed()
+
+
+# --------------------------------------------------------------------------------------------------------- benchmarks
+def test_benchmark_scenarios_cover_every_url():
+    assert missing_scenarios() == []
+
+
+@pytest.mark.django_db
+def test_benchmark_views(tmp_path, settings):
+    settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    call_command('seed_perf_data', '--publishers', '3', '--categories', '3', '--boardgames', '30', '--users', '10',
+                 '--reviews', '80', '--orders', '40', '--cart-ratio', '1', stdout=StringIO())
+    baseline = tmp_path / 'baseline.json'
+    options = ['--baseline', str(baseline), '--iterations', '2', '--warmup', '0']
+
+    call_command('benchmark_views', *options, stdout=StringIO(), stderr=StringIO())
+    results = json.loads(baseline.read_text())
+    assert set(results['views']) == {scenario.name for scenario in SCENARIOS}
+    assert all(result['status'] in (200, 302) for result in results['views'].values())
+    assert Order.objects.count() == 40
+    assert not CustomUser.objects.filter(username='benchmark_admin').exists()
+
+    results['views']['cart_list']['p95_ms'] = 0
+    baseline.write_text(json.dumps(results))
+    with pytest.raises(CommandError, match='cart_list: p95_ms'):
+        call_command('benchmark_views', *options, '--only', 'cart_list', stdout=StringIO(), stderr=StringIO())
+
+
+# ---------------------------------------------------------------------------------------------------------- load test
+@pytest.mark.django_db(transaction=True)
+def test_load_test(live_server, tmp_path):
+    call_command('seed_perf_data', '--publishers', '3', '--categories', '3', '--boardgames', '30', '--users', '4',
+                 '--reviews', '20', '--orders', '10', stdout=StringIO())
+    report = tmp_path / 'load.json'
+
+    call_command('load_test', '--base-url', live_server.url, '--concurrency', '2', '--duration', '1', '--ramp-up', '0',
+                 '--json', str(report), stdout=StringIO())
+    summary = json.loads(report.read_text())
+    assert summary['journeys'] > 0
+    assert summary['steps']['login']['requests'] == 2
+    for step in ('login', 'browse', 'detail'):
+        assert summary['steps'][step]['errors'] == {}
+        assert summary['steps'][step]['p50_ms'] > 0
+
+
+@pytest.mark.django_db
+def test_locked_database_errors_are_tagged(boardgame, monkeypatch):
+    def locked(*args, **kwargs):
+        raise OperationalError('database is locked')
+
+    monkeypatch.setattr(BoardgameDetailView, 'get', locked)
+    client = Client(raise_request_exception=False)
+    response = client.get(reverse('boardgame_details', args=[boardgame.pk]))
+    assert response.status_code == 500
+    assert response['X-DB-Error'] == 'locked'
+    assert 'X-DB-Error' not in client.get(reverse('boardgames_list'))
+
+    class Session:
+        async def request(self, method, path, data=None):
+            return response.status_code, {'x-db-error': response['X-DB-Error']}, b'Server Error (500)'
+
+    load_test = LoadTest('http://testserver', [], 'secret')
+    with pytest.raises(RequestFailed):
+        asyncio.run(load_test.step(Session(), 'detail', 'GET', '/'))
+    assert load_test.steps['detail'].errors == {'locked': 1}
+
+
+# ----------------------------------------------------------------------------------------------------------- database
+@pytest.mark.django_db(transaction=True)
+def test_sqlite_connection_tuning():
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        assert cursor.fetchone()[0] == 'wal'
+        cursor.execute('PRAGMA synchronous')
+        assert cursor.fetchone()[0] == 1
+        cursor.execute('PRAGMA busy_timeout')
+        assert cursor.fetchone()[0] == 5000
+
+    with QueryRecorder() as recorder, transaction.atomic():
+        Boardgame.objects.count()
+    assert recorder.queries[0][0] == 'BEGIN IMMEDIATE'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_sqlite_readers_not_blocked_by_writer(publisher):
+    Boardgame.objects.bulk_create([
+        Boardgame(name=f'game {i}', price=10, description='test', min_players_age=3, min_players=1, max_players=4,
+                  min_game_time=30, publisher=publisher)
+        for i in range(300)
+    ])
+    # An open chunked read keeps its statement, and so its read snapshot, alive between fetches.
+    rows = Boardgame.objects.values_list('id', flat=True).iterator(chunk_size=100)
+    first = next(rows)
+    timings = []
+
+    def write():
+        try:
+            started = time.monotonic()
+            with transaction.atomic():
+                Boardgame.objects.create(name='new', price=10, description='test', min_players_age=3, min_players=1,
+                                         max_players=4, min_game_time=30, publisher=publisher)
+            timings.append(time.monotonic() - started)
+        finally:
+            connection.close()
+
+    def read():
+        try:
+            timings.append(Boardgame.objects.count())
+        finally:
+            connection.close()
+
+    for target in (write, read):
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+    # With a rollback journal the commit would wait for the open reader until busy_timeout and then fail.
+    assert timings[0] < 1
+    assert timings[1] == 301
+    assert len([first, *rows]) == 300
+
+
+# -------------------------------------------------------------------------------------------------------- write queue
+@pytest.mark.django_db(transaction=True)
+def test_write_queue_group_commits(user, boardgame):
+    writer = WriteQueue(max_delay=0.01)
+
+    def hammer():
+        try:
+            for _ in range(25):
+                writer.run(add_to_cart, user, boardgame.pk)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.stop()
+
+    assert CartBoardgame.objects.get(cart__user=user, boardgame=boardgame).quantity == 200
+    assert writer.writes == 200
+    assert writer.batches < writer.writes
+
+
+@pytest.mark.django_db(transaction=True)
+def test_write_queue_isolates_failures(user, boardgame):
+    writer = WriteQueue(max_delay=0.2)
+    missing = writer.submit(add_to_cart, user, boardgame.pk + 1)
+    added = writer.submit(add_to_cart, user, boardgame.pk)
+
+    with pytest.raises(Boardgame.DoesNotExist):
+        missing.result(5)
+    added.result(5)
+    writer.stop()
+    assert writer.batches == 1
+    assert CartBoardgame.objects.filter(cart__user=user).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_views_write_through_queue(user, boardgame, settings):
+    settings.SHOP_WRITE_QUEUE = {'ENABLED': True}
+    client = Client()
+    client.force_login(user)
+    try:
+        client.get(reverse('add_boardgame_to_cart', kwargs={'boardgame_pk': boardgame.pk}))
+        assert client.get(reverse('add_boardgame_to_cart', kwargs={'boardgame_pk': 0})).status_code == 404
+        client.post(reverse('make_order'))
+        client.post(reverse('review_add', kwargs={'boardgame_pk': boardgame.pk}), {'rating': 4, 'comment': 'ok'})
+        assert get_queue().writes == 4
+    finally:
+        shutdown()
+
+    assert Order.objects.get(user=user).orderboardgame_set.get().boardgame == boardgame
+    assert Review.objects.get(user=user).rating == 4
+
+
+# ------------------------------------------------------------------------------------------------------- read replica
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_catalog_reads_from_replica(boardgame, settings):
+    settings.SHOP_READ_REPLICA = {'ENABLED': True}
+    settings.DEBUG = True
+    replication.sync_replica()
+    Boardgame.objects.create(name='fresh', price=10, description='test', min_players_age=3, min_players=1,
+                             max_players=4, min_game_time=30, publisher=boardgame.publisher)
+    client = Client()
+
+    response = client.get(reverse('boardgames_list'))
+    assert response.wsgi_request.reads_replica
+    assert [game.name for game in response.context['object_list']] == ['test']
+    assert 0 <= float(response['X-DB-Replica-Lag']) < 5
+    assert not client.get(reverse('cart_list')).wsgi_request.reads_replica
+
+    replication.sync_replica()
+    response = client.get(reverse('boardgames_list'))
+    assert [game.name for game in response.context['object_list']] == ['fresh', 'test']
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_replica_read_your_writes(user, boardgame, settings):
+    settings.SHOP_READ_REPLICA = {'ENABLED': True}
+    replication.sync_replica()
+    client = Client()
+    client.force_login(user)
+    url = reverse('boardgame_details', kwargs={'pk': boardgame.pk})
+    assert client.get(url).wsgi_request.reads_replica
+
+    client.get(reverse('add_boardgame_to_cart', kwargs={'boardgame_pk': boardgame.pk}))
+    assert not client.get(url).wsgi_request.reads_replica
+
+    replication.sync_replica()
+    assert client.get(url).wsgi_request.reads_replica
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_replica_fallback_to_primary(boardgame, settings):
+    settings.SHOP_READ_REPLICA = {'ENABLED': True, 'MAX_LAG': 30}
+    replication.sync_replica()
+    client = Client()
+    url = reverse('landing_page')
+    assert client.get(url).wsgi_request.reads_replica
+
+    settings.SHOP_READ_REPLICA = {'ENABLED': True, 'MAX_LAG': -1}
+    assert replication.replica_lag() > -1
+    assert not client.get(url).wsgi_request.reads_replica
+
+    settings.SHOP_READ_REPLICA = {'ENABLED': True}
+    ReplicaHeartbeat.objects.using('replica').all().delete()
+    replication.reset()
+    assert replication.replica_lag() is None
+    assert not client.get(url).wsgi_request.reads_replica
+
+
+# --------------------------------------------------------------------------------------------------------- page cache
+@pytest.mark.django_db
+def test_page_cache_anonymous(user, boardgame, settings, django_capture_on_commit_callbacks):
+    settings.SHOP_PAGE_CACHE = {'ENABLED': True}
+    client = Client()
+    url = reverse('boardgames_list')
+    details_url = reverse('boardgame_details', args=[boardgame.pk])
+    reviews_url = reverse('reviews_list', args=[boardgame.pk])
+
+    first = client.get(url + '?players=2&q=test&category=')
+    assert first['X-Page-Cache'] == 'MISS'
+    second = client.get(url + '?q=test&players=2')
+    assert second['X-Page-Cache'] == 'HIT'
+    assert second.content == first.content
+    for page in (url, details_url, reviews_url):
+        client.get(page)
+        assert client.get(page)['X-Page-Cache'] == 'HIT'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Review.objects.create(user=user, boardgame=boardgame, rating=3, comment='ok')
+    assert client.get(reviews_url)['X-Page-Cache'] == 'MISS'
+    assert client.get(details_url)['X-Page-Cache'] == 'MISS'
+    assert client.get(url)['X-Page-Cache'] == 'HIT'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        boardgame.name = 'renamed'
+        boardgame.save()
+    response = client.get(url)
+    assert response['X-Page-Cache'] == 'MISS'
+    assert b'renamed' in response.content
+    assert client.get(details_url)['X-Page-Cache'] == 'MISS'
+
+    client.force_login(user)
+    assert client.get(url)['X-Page-Cache'] == 'MISS'
+    settings.SHOP_PAGE_CACHE = {'ENABLED': True, 'SHELLS': False}
+    assert 'X-Page-Cache' not in client.get(url)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_page_cache_stale_while_revalidate(boardgame, settings):
+    settings.SHOP_PAGE_CACHE = {'ENABLED': True, 'TIMEOUT': 0}
+    client = Client()
+    url = reverse('boardgame_details', args=[boardgame.pk])
+    assert client.get(url)['X-Page-Cache'] == 'MISS'
+
+    # Not an edit the tags see, so the page only changes once it is revalidated.
+    Boardgame.objects.filter(pk=boardgame.pk).update(description='revalidated')
+    response = client.get(url)
+    assert response['X-Page-Cache'] == 'STALE'
+    assert b'revalidated' not in response.content
+
+    deadline = time.monotonic() + 5
+    while b'revalidated' not in response.content and time.monotonic() < deadline:
+        time.sleep(0.05)
+        response = client.get(url)
+    assert response['X-Page-Cache'] == 'STALE'
+    assert b'revalidated' in response.content
+
+
+@pytest.mark.django_db
+def test_page_cache_shells(user, superuser, review, settings):
+    settings.SHOP_PAGE_CACHE = {'ENABLED': True}
+    other = CustomUser.objects.create(username='other', email='other@op.pl')
+    details_url = reverse('boardgame_details', args=[review.boardgame.pk])
+    list_url = reverse('boardgames_list')
+    client = Client()
+
+    def nav_user(username):
+        return f'{reverse("profile_view")}">{username}<'.encode()
+
+    client.force_login(user)
+    response = client.get(details_url)
+    assert response['X-Page-Cache'] == 'MISS'
+    assert nav_user('test') in response.content
+    assert b'Your Review' in response.content
+    assert b'<!--hole:' not in response.content
+    client.get(list_url)
+
+    # Another user gets the same shell with their own holes.
+    client.force_login(other)
+    response = client.get(details_url)
+    assert response['X-Page-Cache'] == 'HIT'
+    assert nav_user('other') in response.content
+    assert nav_user('test') not in response.content
+    assert b'Add Review' in response.content
+    response = client.get(list_url)
+    assert response['X-Page-Cache'] == 'HIT'
+    assert b'>Edit<' not in response.content
+
+    client.force_login(superuser)
+    response = client.get(list_url)
+    assert response['X-Page-Cache'] == 'MISS'
+    assert b'>Edit<' in response.content
+    assert b'Add boardgame' in response.content
+
+
+@pytest.mark.django_db
+def test_hole_view(user, review):
+    client = Client()
+    client.force_login(user)
+    url = reverse('hole')
+    response = client.get(url, {'name': 'review_button', 'boardgame_pk': review.boardgame.pk})
+    assert response.status_code == 200
+    assert b'Your Review' in response.content
+    assert 'private' in response['Cache-Control']
+    assert client.get(url, {'name': 'account_nav'}).content.count(b'Logout') == 1
+    assert client.get(url, {'name': 'unknown'}).status_code == 404
+    assert client.get(url, {'name': 'review_button', 'boardgame_pk': 'x'}).status_code == 404
+
+
+# ---------------------------------------------------------------------------------------------------- conditional get
+@pytest.mark.django_db
+def test_conditional_get_details(user, boardgame, django_capture_on_commit_callbacks):
+    client = Client()
+    url = reverse('boardgame_details', args=[boardgame.pk])
+    response = client.get(url)
+    etag = response['ETag']
+    assert etag.startswith('W/"')
+    assert 'Last-Modified' in response
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert not response.templates
+    assert client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code == 304
+
+    boardgame.price = 150
+    boardgame.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    etag = response['ETag']
+
+    # A rating change is an F() update, it still moves the validators.
+    client.force_login(user)
+    user_etag = client.get(url)['ETag']
+    assert user_etag != etag
+    Review.objects.create(user=user, boardgame=boardgame, rating=4, comment='ok')
+    assert client.get(url, HTTP_IF_NONE_MATCH=user_etag).status_code == 200
+    client.logout()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_conditional_get_details_follows_categories(boardgame, category):
+    client = Client()
+    url = reverse('boardgame_details', args=[boardgame.pk])
+    etags = [client.get(url)['ETag']]
+    party = Category.objects.create(name='party')
+
+    for change in (lambda: boardgame.categories.add(party), lambda: party.boardgame_set.remove(boardgame),
+                   lambda: category.boardgame_set.clear()):
+        change()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etags[-1])
+        assert response.status_code == 200
+        etags.append(response['ETag'])
+    assert len(set(etags)) == 4
+
+
+@pytest.mark.django_db
+def test_conditional_get_lists(user, boardgame, django_capture_on_commit_callbacks):
+    client = Client()
+    for url in (reverse('boardgames_list'), reverse('reviews_list', args=[boardgame.pk]),
+                reverse('boardgames_api')):
+        etag = client.get(url)['ETag']
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        with django_capture_on_commit_callbacks(execute=True):
+            Review.objects.create(user=CustomUser.objects.create(username=url, email=f'{url}@op.pl'),
+                                  boardgame=boardgame, rating=4)
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    url = reverse('boardgames_list')
+    etag = client.get(url)['ETag']
+    with django_capture_on_commit_callbacks(execute=True):
+        boardgame.delete()
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_boardgames_api(boardgame, publisher):
+    for i in range(25):
+        Boardgame.objects.create(name=f'game {i:02d}', price=10, description='test', min_players_age=3,
+                                 min_players=1, max_players=4, min_game_time=30, publisher=publisher)
+    client = Client()
+    data = client.get(reverse('boardgames_api')).json()
+    assert len(data['results']) == 20
+    assert data['results'][0]['name'] == 'game 00'
+    assert data['previous'] is None
+
+    data = client.get(reverse('boardgames_api') + data['next']).json()
+    assert [item['name'] for item in data['results']][-1] == 'test'
+    updated_at = data['results'][-1].pop('updated_at')
+    assert updated_at[:19] == Boardgame.objects.get(pk=boardgame.pk).updated_at.isoformat()[:19]
+    assert data['results'][-1] == {
+        'id': boardgame.pk, 'url': reverse('boardgame_details', args=[boardgame.pk]), 'name': 'test',
+        'price': '100.00', 'publisher': 'testPublisher', 'categories': ['testCategory'], 'min_players': 2,
+        'max_players': 4, 'min_players_age': 3, 'min_game_time': 30, 'max_game_time': 90, 'is_available': True,
+        'rating_avg': None, 'rating_count': 0,
+    }
+
+
+@pytest.mark.django_db
+def test_conditional_get_page_cache(user, boardgame, settings):
+    settings.SHOP_PAGE_CACHE = {'ENABLED': True}
+    other = CustomUser.objects.create(username='other', email='other@op.pl')
+    url = reverse('boardgame_details', args=[boardgame.pk])
+    client = Client()
+
+    etag = client.get(url)['ETag']
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['X-Page-Cache'] == 'HIT'
+
+    client.force_login(user)
+    user_etag = client.get(url)['ETag']
+    client.force_login(other)
+    response = client.get(url, HTTP_IF_NONE_MATCH=user_etag)
+    assert response['X-Page-Cache'] == 'HIT'
+    assert response.status_code == 200
+    assert response['ETag'] not in (etag, user_etag)
+    assert client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+
+# -------------------------------------------------------------------------------------------------------- shared cache
+def _shared_cache(path, **options):
+    return SQLiteCache(path, {'OPTIONS': options})
+
+
+def _bump_shared_counter(path, times):
+    cache = _shared_cache(path)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+def test_shared_cache_between_processes(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = _shared_cache(path)
+    cache.add('counter', 0, None)
+    workers = [multiprocessing.get_context('fork').Process(target=_bump_shared_counter, args=(path, 200))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    assert cache.get('counter') == 800
+    with pytest.raises(ValueError):
+        cache.incr('missing')
+
+
+def test_shared_cache_expiry_and_eviction(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = _shared_cache(path, MAX_ENTRIES=10, CULL_FREQUENCY=2, ACCESS_RESOLUTION=0, L1_TIMEOUT=0)
+    cache.set('short', 'value', 0.05)
+    assert cache.add('short', 'other') is False
+    time.sleep(0.1)
+    assert cache.get('short') is None
+    assert cache.add('short', 'other') is True
+
+    cache.clear()
+    for i in range(10):
+        cache.set(f'key{i}', i)
+    cache.get('key0')
+    cache.set('key10', 10)
+    # Over MAX_ENTRIES, the least recently read go down to half of it; key0 was read just before the last set.
+    assert set(cache.get_many([f'key{i}' for i in range(11)])) == {'key0', 'key7', 'key8', 'key9', 'key10'}
+
+    cache.clear()
+    cache = _shared_cache(path, MAX_SIZE=4000, CULL_FREQUENCY=2, ACCESS_RESOLUTION=0, L1_TIMEOUT=0)
+    for i in range(5):
+        cache.set(f'blob{i}', b'x' * 1000)
+    entries, size = cache._connection().execute('SELECT entries, size FROM cache_usage').fetchone()
+    assert size <= 4000
+    assert entries == len(cache.get_many([f'blob{i}' for i in range(5)]))
+    assert cache.get('blob4') is not None
+
+
+def test_shared_cache_l1(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = _shared_cache(path, L1_TIMEOUT=0.2)
+    cache.set('page', 'cached')
+    cache.set('version', 1)
+
+    # Another worker's writes, straight to the database.
+    with sqlite3.connect(path) as other:
+        other.execute("UPDATE cache_entry SET value = ? WHERE key = ':1:page'", (pickle.dumps('changed'),))
+        other.execute("UPDATE cache_entry SET value = 2 WHERE key = ':1:version'")
+
+    assert cache.get('page') == 'cached'
+    assert cache.get('version') == 2
+    time.sleep(0.25)
+    assert cache.get('page') == 'changed'
+
+    cache.delete('page')
+    assert cache.get('page') is None
+
+
 # -------------------------------------------------------------------------------------------------------- user profile
 @pytest.mark.django_db
 def test_user_profile_authenticated(user):
@@ -23,4 +23,9 @@ urlpatterns = [
     path('reviews_list/<int:boardgame_pk>/', views.ReviewsListView.as_view(), name='reviews_list'),
     path('profile_view/', views.UserProfileView.as_view(), name='profile_view'),
     path('profile_edit/', views.EditProfileView.as_view(), name='profile_edit'),
+    path('export/catalog/', views.ExportView.as_view(export='catalog'), name='export_catalog'),
+    path('export/orders/', views.ExportView.as_view(export='orders'), name='export_orders'),
+    path('sales_report/', views.SalesReportView.as_view(), name='sales_report'),
+    path('hole/', views.HoleView.as_view(), name='hole'),
+    path('api/boardgames/', views.BoardgameApiView.as_view(), name='boardgames_api'),
 ]
@@ -0,0 +1,54 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_VERSION = 'shop:catalog:version'
+
+
+def _clock_version():
+    # Starting from the clock rather than 1, a version evicted from the cache never comes back as an old one.
+    return time.time_ns() // 1000
+
+
+def get_version(key):
+    initial = _clock_version()
+    cache.add(key, initial, None)
+    return cache.get(key, initial)
+
+
+def bump_version(key):
+    get_version(key)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return None
+
+
+def bump_version_on_commit(key):
+    transaction.on_commit(lambda: bump_version(key))
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            initial = _clock_version()
+            cache.add(key, initial, None)
+            versions[key] = cache.get(key, initial)
+    return versions
+
+
+def bump_versions(keys):
+    for key in keys:
+        if not cache.add(key, _clock_version(), None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                pass
+
+
+def bump_versions_on_commit(keys):
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: bump_versions(keys))
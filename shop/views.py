@@ -1,59 +1,127 @@
-import random
+import datetime
 
 from django.contrib.auth.mixins import UserPassesTestMixin, LoginRequiredMixin
 from django.db import IntegrityError
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date
 from django.views import View
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 
 from accounts.models import CustomUser
-from shop.models import Boardgame, Cart, CartBoardgame, Order, OrderBoardgame, Review
+from shop import facets, fragments
+from shop.cart import add_to_cart, load_cart, remove_from_cart
+from shop.checkout import place_order
+from shop.conditional import (ConditionalGetMixin, boardgame_validators, catalog_api_validators, catalog_validators,
+                              reviews_validators)
+from shop.exporting import CONTENT_TYPES, EXPORTS
+from shop.models import Boardgame, Order, OrderBoardgame, Review
 from shop.forms import CustomUserForm
+from shop.holes import HOLES, render_hole, review_button_context
+from shop.pagination import KeysetPaginationMixin
+from shop.reporting import sales_report
+from shop.sampling import sample_boardgames
+from shop.search import search_boardgames
+from shop.writer import run_write
 
 
 class LandingPageView(TemplateView):
     template_name = 'landing_page.html'
+    replica_reads = True
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        all_boardgames = Boardgame.objects.all()
-        shuffled_boardgames = list(all_boardgames)
-        random.shuffle(shuffled_boardgames)
-        context['carousel_boardgames'] = shuffled_boardgames[:3]
+        context['carousel_boardgames'] = sample_boardgames(3)
         return context
 
 
-class BoardgameListView(ListView):
+class BoardgameListView(ConditionalGetMixin, KeysetPaginationMixin, ListView):
     model = Boardgame
+    replica_reads = True
+    validators = staticmethod(catalog_validators)
     template_name = "shop/boardgames_list.html"
+    keyset_ordering = ('name', 'id')
 
     def get_queryset(self):
         queryset = super().get_queryset()
         query = self.request.GET.get('q')
         if query:
-            queryset = queryset.filter(name__icontains=query)
-        return queryset
+            queryset = search_boardgames(queryset, query)
+        self.facet_selection = facets.parse_selection(self.request.GET)
+        return facets.filter_boardgames(queryset, self.facet_selection)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q')
+        base = None
+        if query:
+            matches = search_boardgames(Boardgame.objects.order_by(), query)
+            base = facets.bitset(matches.values_list('pk', flat=True))
+        context['facets'], context['result_count'] = facets.summarize(self.facet_selection, self.request.GET, base)
+        context['boardgame_cards'] = fragments.render_cards(context['object_list'],
+                                                            fragments.card_variant(self.request.user))
+        return context
+
+    def get_keyset_ordering(self):
+        if self.request.GET.get('q'):
+            return ('search_rank', 'id')
+        return self.keyset_ordering
 
-class BoardgameDetailView(DetailView):
+
+class BoardgameDetailView(ConditionalGetMixin, DetailView):
     model = Boardgame
+    replica_reads = True
+    validators = staticmethod(boardgame_validators)
     template_name = "shop/boardgame_details.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        boardgame = self.get_object()
-        if self.request.user.is_authenticated:
-            user_review = Review.objects.filter(user=self.request.user, boardgame=boardgame).first()
-            context['is_reviewed'] = user_review is not None
-            if user_review:
-                context["review"] = user_review
-        else:
-            context["is_reviewed"] = False
-
+        # A shell leaves the review button as a hole, filled for each visitor.
+        if not getattr(self.request, 'renders_shell', False):
+            context.update(review_button_context(self.request, self.object.pk))
         return context
 
 
+class BoardgameApiView(ConditionalGetMixin, KeysetPaginationMixin, ListView):
+    model = Boardgame
+    replica_reads = True
+    validators = staticmethod(catalog_api_validators)
+    keyset_ordering = ('name', 'id')
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('publisher').prefetch_related('categories')
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse({
+            'results': [
+                {
+                    'id': boardgame.pk,
+                    'url': reverse('boardgame_details', args=[boardgame.pk]),
+                    'name': boardgame.name,
+                    'price': boardgame.price,
+                    'publisher': boardgame.publisher.name,
+                    'categories': [category.name for category in boardgame.categories.all()],
+                    'min_players': boardgame.min_players,
+                    'max_players': boardgame.max_players,
+                    'min_players_age': boardgame.min_players_age,
+                    'min_game_time': boardgame.min_game_time,
+                    'max_game_time': boardgame.max_game_time,
+                    'is_available': boardgame.is_available,
+                    'rating_avg': boardgame.rating_avg,
+                    'rating_count': boardgame.rating_count,
+                    'updated_at': boardgame.updated_at,
+                }
+                for boardgame in context['object_list']
+            ],
+            'next': context['next_page_url'],
+            'previous': context['previous_page_url'],
+        }, **response_kwargs)
+
+
 class BoardgameAddView(UserPassesTestMixin, CreateView):
     model = Boardgame
     fields = '__all__'
@@ -100,61 +168,35 @@ class BoardgameDeleteView(UserPassesTestMixin, DeleteView):
 
 class CartListView(LoginRequiredMixin, View):
     def get(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        return render(request, 'shop/cart_list.html', {'cart': cart})
+        summary = load_cart(request.user)
+        return render(request, 'shop/cart_list.html', {'cart': summary.cart, 'cart_summary': summary})
 
 
 class AddBoardgameToCartView(LoginRequiredMixin, View):
     def get(self, request, boardgame_pk):
-        boardgame = Boardgame.objects.get(pk=boardgame_pk)
-        cart, created = Cart.objects.get_or_create(user=request.user)
-
         try:
-            cart_item = CartBoardgame.objects.get(boardgame=boardgame, cart=cart)
-            cart_item.quantity += 1
-            cart_item.save()
-        except CartBoardgame.DoesNotExist:
-            cart.boardgames.add(boardgame)
-
+            run_write(add_to_cart, request.user, boardgame_pk)
+        except Boardgame.DoesNotExist:
+            raise Http404('Boardgame does not exist.')
         return redirect('cart_list')
 
 
 class DeleteBoardgameFromCartView(LoginRequiredMixin, View):
     def get(self, request, boardgame_pk):
-        boardgame = Boardgame.objects.get(pk=boardgame_pk)
-        cart, created = Cart.objects.get_or_create(user=request.user)
-
-        cart_item = CartBoardgame.objects.get(boardgame=boardgame, cart=cart)
-        if cart_item.quantity > 1:
-            cart_item.quantity -= 1
-            cart_item.save()
-        else:
-            cart_item.delete()
-
+        run_write(remove_from_cart, request.user, boardgame_pk)
         return redirect('cart_list')
 
 
 class MakeOrderView(LoginRequiredMixin, View):
     def post(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
-
-        if created or not cart.cartboardgame_set.all():
-            return redirect('cart_list')
-
-        order = Order.objects.create(user=request.user)
-
-        for cart_boardgame in cart.cartboardgame_set.all():
-            OrderBoardgame.objects.create(boardgame=cart_boardgame.boardgame,
-                                          order=order,
-                                          quantity=cart_boardgame.quantity)
-
-        cart.cartboardgame_set.all().delete()
+        run_write(place_order, request.user)
         return redirect('cart_list')
 
 
-class OrdersListView(LoginRequiredMixin, ListView):
+class OrdersListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Order
     template_name = 'shop/order_list.html'
+    keyset_ordering = ('-date_ordered', '-id')
 
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user)
@@ -164,6 +206,10 @@ class OrderDetailView(LoginRequiredMixin, DetailView):
     model = Order
     template_name = 'shop/order_detail.html'
 
+    def get_queryset(self):
+        lines = OrderBoardgame.objects.select_related('boardgame').order_by('id')
+        return Order.objects.filter(user=self.request.user).prefetch_related(Prefetch('orderboardgame_set', lines))
+
 
 class ReviewAddView(LoginRequiredMixin, CreateView):
     model = Review
@@ -184,7 +230,8 @@ class ReviewAddView(LoginRequiredMixin, CreateView):
 
         form.instance.boardgame = boardgame
         form.instance.user = self.request.user
-        return super().form_valid(form)
+        self.object = run_write(form.save)
+        return HttpResponseRedirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse_lazy('boardgame_details', kwargs={'pk': self.kwargs['boardgame_pk']})
@@ -195,6 +242,7 @@ class ReviewAddView(LoginRequiredMixin, CreateView):
 
 class ReviewDitailView(LoginRequiredMixin, DetailView):
     model = Review
+    queryset = Review.objects.select_related('boardgame', 'user')
     template_name = 'shop/review_detail.html'
     context_object_name = 'review'
 
@@ -239,13 +287,16 @@ class ReviewDeleteView(LoginRequiredMixin, DeleteView):
         return self.request.user.is_authenticated
 
 
-class ReviewsListView(ListView):
+class ReviewsListView(ConditionalGetMixin, KeysetPaginationMixin, ListView):
     model = Review
+    replica_reads = True
+    validators = staticmethod(reviews_validators)
     template_name = 'shop/reviews_list.html'
+    keyset_ordering = ('-created', '-id')
 
     def get_queryset(self):
         boardgame_pk = self.kwargs['boardgame_pk']
-        return Review.objects.filter(boardgame_id=boardgame_pk)
+        return Review.objects.filter(boardgame_id=boardgame_pk).select_related('user')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -271,3 +322,59 @@ class EditProfileView(LoginRequiredMixin, UpdateView):
         context = super().get_context_data(**kwargs)
         context['title'] = 'Edit Profile'
         return context
+
+
+class ExportView(UserPassesTestMixin, View):
+    export = None
+
+    def get(self, request):
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in CONTENT_TYPES:
+            raise Http404('Unknown export format.')
+        response = StreamingHttpResponse(EXPORTS[self.export](export_format), content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{self.export}.{export_format}"'
+        return response
+
+    def test_func(self):
+        return self.request.user.is_superuser
+
+
+class SalesReportView(UserPassesTestMixin, TemplateView):
+    template_name = 'shop/sales_report.html'
+    default_days = 30
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        end = self.get_date('end') or timezone.localdate()
+        start = self.get_date('start') or end - datetime.timedelta(days=self.default_days - 1)
+        context['title'] = 'Sales Report'
+        context['start'] = start
+        context['end'] = end
+        context['report'] = sales_report(start, end)
+        return context
+
+    def get_date(self, name):
+        try:
+            return parse_date(self.request.GET.get(name, ''))
+        except ValueError:
+            return None
+
+    def test_func(self):
+        return self.request.user.is_superuser
+
+
+class HoleView(View):
+    """One hole of a page shell, for pages that fill their holes from the browser."""
+
+    def get(self, request):
+        params = request.GET.dict()
+        name = params.pop('name', None)
+        if name not in HOLES:
+            raise Http404('Unknown hole.')
+        try:
+            content = render_hole(request, name, params)
+        except (TypeError, ValueError):
+            raise Http404('Invalid hole arguments.')
+        response = HttpResponse(content)
+        patch_cache_control(response, private=True)
+        return response
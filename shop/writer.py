@@ -0,0 +1,131 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from shop import replication
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_DELAY = 0.002
+DEFAULT_TIMEOUT = 30
+
+_STOP = object()
+
+
+class WriteQueue:
+    """One writer thread that runs queued write functions, committing each batch in a single transaction."""
+
+    def __init__(self, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.jobs = queue.SimpleQueue()
+        self.batches = 0
+        self.writes = 0
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self._loop, name='shop-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self.jobs.put((future, func, args, kwargs))
+        return future
+
+    def run(self, func, *args, timeout=DEFAULT_TIMEOUT, **kwargs):
+        return self.submit(func, *args, **kwargs).result(timeout)
+
+    def stop(self):
+        self.jobs.put(_STOP)
+        self.thread.join()
+
+    def _next_batch(self):
+        job = self.jobs.get()
+        if job is _STOP:
+            return None
+        batch = [job]
+        # Wait a moment for company: every write that joins the batch shares its BEGIN and its commit.
+        while len(batch) < self.max_batch:
+            try:
+                job = self.jobs.get(timeout=self.max_delay)
+            except queue.Empty:
+                break
+            if job is _STOP:
+                self.jobs.put(_STOP)
+                break
+            batch.append(job)
+        return batch
+
+    def _loop(self):
+        try:
+            while (batch := self._next_batch()) is not None:
+                batch = [job for job in batch if job[0].set_running_or_notify_cancel()]
+                if batch:
+                    self._commit(batch)
+        finally:
+            connection.close()
+
+    def _commit(self, batch):
+        close_old_connections()
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for future, func, args, kwargs in batch:
+                    # A savepoint per write, so one failing write is rolled back alone.
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((future, func(*args, **kwargs), None))
+                    except Exception as error:
+                        outcomes.append((future, None, error))
+        except Exception as error:
+            for future, _, _, _ in batch:
+                future.set_exception(error)
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        # Results are handed back only once they are committed.
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_queue = None
+_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'SHOP_WRITE_QUEUE', {}).get('ENABLED', False)
+
+
+def get_queue():
+    global _queue
+    writer = _queue
+    # A forked worker inherits the object but not the thread, so it starts its own.
+    if writer is None or writer.pid != os.getpid():
+        with _lock:
+            if _queue is None or _queue.pid != os.getpid():
+                options = getattr(settings, 'SHOP_WRITE_QUEUE', {})
+                _queue = WriteQueue(options.get('MAX_BATCH', DEFAULT_MAX_BATCH),
+                                    options.get('MAX_DELAY', DEFAULT_MAX_DELAY))
+            writer = _queue
+    return writer
+
+
+def shutdown():
+    global _queue
+    with _lock:
+        if _queue is not None and _queue.pid == os.getpid():
+            _queue.stop()
+        _queue = None
+
+
+def run_write(func, *args, **kwargs):
+    # Inside a transaction the caller may already hold the write lock, and its writes must commit with it.
+    if not is_enabled() or connection.in_atomic_block:
+        return func(*args, **kwargs)
+    timeout = getattr(settings, 'SHOP_WRITE_QUEUE', {}).get('TIMEOUT', DEFAULT_TIMEOUT)
+    replication.mark_write()
+    return get_queue().run(func, *args, timeout=timeout, **kwargs)